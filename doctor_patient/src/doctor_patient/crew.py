@@ -1,89 +1,739 @@
 # src/doctor_patient/crew.py
 from __future__ import annotations
 
-from typing import List
-import requests
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Tuple
+import os
 import json
 import re
+import time
 
+from .tools import symptom_tier
 from .tools.retrieval import (
-    get_dialogues_and_raw_for_chief_complaint,  # subjective-based retrieval
+    get_patient_turns_for_chief_complaint,      # subjective-based retrieval
     get_candidate_drugs_for_symptoms,           # for the drug flow
     get_similar_cases_for_summary,              # for the summary flow
+    get_candidate_symptoms_for_chief_complaint, # retrieval-only fallback
+    extract_medications,                        # drugs named in the complaint
+    _extract_chief_complaint_text,
 )
 
 # Ollama HTTP endpoint
 OLLAMA_URL = "http://localhost:11434/api/chat"
 
+# How run_symptom_flow gets its JSON from the model:
+#   "stream" - stream the reply and stop as soon as symptom_options closes
+#   "schema" - Ollama structured output (format=<JSON schema>), no extraction
+#   "text"   - one blocking call, then scan the full reply for JSON
+SYMPTOM_OUTPUT_MODE = os.environ.get("DOCTOR_PATIENT_SYMPTOM_OUTPUT", "stream")
+
+SYMPTOM_OPTIONS_SCHEMA = {
+    "type": "object",
+    "properties": {
+        "symptom_options": {
+            "type": "array",
+            "items": {"type": "string"},
+            "maxItems": 5,
+        },
+    },
+    "required": ["symptom_options"],
+}
+
+
+# ---------------------------------------------------------------------
+# Prompt layout: one shared system prefix + a short per-step suffix
+# ---------------------------------------------------------------------
+# Every LLM step sends SYSTEM_PREFIX verbatim as the system message and only
+# its own data ("STEP: <name>" + complaint, dialogues, ...) as the user
+# message. Ollama reuses its KV cache for the longest prefix of a prompt it
+# has already evaluated on the loaded model, so the instructions are
+# processed once rather than on every step; within an OllamaSession the
+# earlier steps of the conversation are reused the same way.
+
+SYSTEM_PREFIX = """\
+You are a clinical documentation helper for a research-only prototype
+(RESEARCH DEMO ONLY - NOT MEDICAL ADVICE). You support a step-by-step
+patient intake built on doctor-patient dialogues from ACI-Bench.
+
+Each user message starts with "STEP: <name>" followed by the data for that
+step. Earlier steps of the same session may precede it; follow the
+instructions for the current step only.
+
+STEP: symptom_options
+You are given a patient's chief complaint and a few similar historical
+doctor-patient dialogues (often just the patient turns that match it).
+
+1. Infer up to 5 short symptom phrases that could *reasonably co-occur*
+   with this patient's complaint, based on the patterns you see in the
+   similar dialogues.
+2. Each phrase must be concise (<= 12 words).
+3. Do not mention diagnoses or treatments, only *symptoms* or *feelings*.
+4. Return ONLY a JSON object with this exact structure:
+
+{
+  "symptom_options": [
+    "symptom phrase 1",
+    "symptom phrase 2"
+  ]
+}
+
+You MAY include some explanation in natural language BEFORE the JSON,
+but the JSON block itself must be valid.
+
+STEP: summary
+You are given the chief complaint, the symptoms and medications the patient
+confirmed, and similar cases (compact JSON view). Write a compact SOAP-style
+note with these sections:
+
+### Subjective
+- 1-3 sentences combining chief complaint and key symptoms.
+
+### Objective
+- Describe which exams/tests are *typically* done (vital signs, labs, imaging, etc.)
+- Do NOT invent specific numeric values.
+
+### Assessment
+- Generic, no diagnosis. Example style:
+  "Symptoms suggest a possible acute condition, but further evaluation is needed."
+
+### Plan
+- Only HIGH-LEVEL actions such as:
+  - book appointment with a primary care physician
+  - consider physical examination
+  - clinician may consider lab tests or imaging
+- Do NOT recommend specific drugs or doses.
+- Do NOT give emergency / triage advice.
+- Do NOT talk directly to the patient; write as a neutral note.
+"""
+
+# Per-call HTTP timeout when a step has no latency budget.
+LLM_TIMEOUT_S = 60.0
+
+# Latency budget (seconds, retrieval included) per wizard step. An LLM
+# answer that misses it is dropped and the step is served retrieval-only;
+# 0 disables the deadline (LLM_TIMEOUT_S still applies per call).
+STEP_BUDGET_S = {
+    "symptom_options": float(os.environ.get("DOCTOR_PATIENT_SYMPTOM_BUDGET_S", "10")),
+    "summary": float(os.environ.get("DOCTOR_PATIENT_SUMMARY_BUDGET_S", "30")),
+}
+
+# How long Ollama keeps the model (and its prompt cache) loaded after a
+# session's request; long enough to span the wizard's steps.
+OLLAMA_KEEP_ALIVE = os.environ.get("DOCTOR_PATIENT_OLLAMA_KEEP_ALIVE", "30m")
+
 
 # ---------------------------------------------------------------------
-# Low-level Ollama helper
+# Low-level Ollama helpers
 # ---------------------------------------------------------------------
-def ollama_chat(prompt: str, model: str = "llama3") -> str:
-    """Send a chat completion request directly to Ollama."""
+def _chat_payload(
+    messages: List[Dict[str, str]],
+    model: str,
+    stream: bool,
+    format: str | dict | None = None,
+    keep_alive: str | None = None,
+    temperature: float | None = 0.4,
+) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
+        "model": model,
+        "messages": messages,
+        "stream": stream,
+    }
+    if temperature is not None:
+        # Sampling parameters only take effect under "options".
+        payload["options"] = {"temperature": temperature}
+    if format is not None:
+        payload["format"] = format
+    if keep_alive is not None:
+        payload["keep_alive"] = keep_alive
+    return payload
+
+
+def _post_chat(payload: Dict[str, Any], timeout: float = LLM_TIMEOUT_S) -> Dict[str, Any]:
+    """Blocking /api/chat call; returns Ollama's response dict ({} on error)."""
     try:
-        payload = {
-            "model": model,
-            "messages": [{"role": "user", "content": prompt}],
-            "stream": False,
-            "temperature": 0.4,
-        }
+        import requests  # deferred: only paid by processes that call the LLM
 
-        resp = requests.post(OLLAMA_URL, json=payload, timeout=60)
+        resp = requests.post(OLLAMA_URL, json=payload, timeout=timeout)
         resp.raise_for_status()
-        data = resp.json()
+        return resp.json()
+    except Exception as e:
+        print("[ollama error]", e)
+        return {}
+
+
+def _iter_chat_stream(
+    payload: Dict[str, Any],
+    timeout: float = LLM_TIMEOUT_S,
+) -> Iterator[Dict[str, Any]]:
+    """
+    Streaming /api/chat call, yielding each response line as a dict (the
+    last one has ``done`` and the eval counters). Closing the generator
+    early closes the connection, which stops generation on the server.
+    ``timeout`` bounds the whole stream, not just each read.
+    """
+    deadline = time.monotonic() + timeout
+    try:
+        import requests
 
-        # Ollama's /api/chat usually returns: {"message": {"role": "...", "content": "..."}}
-        return data.get("message", {}).get("content", "") or ""
+        with requests.post(OLLAMA_URL, json=payload, timeout=timeout, stream=True) as resp:
+            resp.raise_for_status()
+            for line in resp.iter_lines():
+                if time.monotonic() > deadline:
+                    print(f"[ollama error] stream exceeded {timeout:.1f}s")
+                    return
+                if not line:
+                    continue
+                data = json.loads(line)
+                yield data
+                if data.get("done"):
+                    return
     except Exception as e:
         print("[ollama error]", e)
-        return ""
+
+
+def _user_messages(prompt: str, system: str | None) -> List[Dict[str, str]]:
+    messages = [{"role": "system", "content": system}] if system else []
+    messages.append({"role": "user", "content": prompt})
+    return messages
+
+
+def ollama_chat(
+    prompt: str,
+    model: str = "llama3",
+    format: str | dict | None = None,
+    system: str | None = None,
+) -> str:
+    """
+    Send a chat completion request directly to Ollama.
+
+    ``format`` is passed through to Ollama's structured-output mode: "json"
+    or a JSON schema dict makes the reply a bare JSON document.
+    """
+    data = _post_chat(_chat_payload(_user_messages(prompt, system), model, False, format))
+
+    # Ollama's /api/chat usually returns: {"message": {"role": "...", "content": "..."}}
+    return data.get("message", {}).get("content", "") or ""
+
+
+# ---------------------------------------------------------------------
+# Session: one wizard run as one /api/chat conversation
+# ---------------------------------------------------------------------
+def _ns_to_ms(value: Any) -> float | None:
+    return value / 1e6 if isinstance(value, (int, float)) else None
+
+
+class OllamaSession:
+    """
+    One wizard session's conversation with Ollama.
+
+    The message history (SYSTEM_PREFIX, then each step's request and reply)
+    is re-sent with every step, so a step's prompt extends the previous one
+    and Ollama only has to evaluate the new suffix; ``keep_alive`` keeps the
+    model and its cache loaded between steps. Re-running a step (e.g. after
+    "Back") drops that step's earlier turn and everything after it.
+
+    The cache is per model, so history is too: a call only replays the
+    turns produced on its own model. A step routed to another model than
+    the previous one starts a fresh conversation (SYSTEM_PREFIX + its own
+    message) instead of paying to evaluate history that model never saw.
+
+    ``stats`` gets one entry per call with Ollama's ``prompt_eval_count`` and
+    ``prompt_eval_duration``: how much of the prompt was actually processed.
+    A stream that is closed early never receives those counters; its entry
+    has the time to first chunk instead, and its turn is left to the caller
+    (``remember``), since the truncated text is not a reply worth replaying.
+    """
+
+    def __init__(
+        self,
+        model: str = "llama3",
+        keep_alive: str | None = OLLAMA_KEEP_ALIVE,
+        system: str = SYSTEM_PREFIX,
+    ) -> None:
+        self.model = model
+        self.keep_alive = keep_alive
+        self.system = system
+        self.turns: List[Tuple[str, str, str, str]] = []   # (step, user, assistant, model)
+        self.stats: List[Dict[str, Any]] = []
+
+    def _messages(self, step: str, content: str, model: str) -> List[Dict[str, str]]:
+        for i, turn in enumerate(self.turns):
+            if turn[0] == step:
+                del self.turns[i:]
+                break
+        messages = [{"role": "system", "content": self.system}]
+        for _, user, assistant, turn_model in self.turns:
+            if turn_model != model:
+                continue
+            messages.append({"role": "user", "content": user})
+            messages.append({"role": "assistant", "content": assistant})
+        messages.append({"role": "user", "content": content})
+        return messages
+
+    def _record(
+        self,
+        step: str,
+        content: str,
+        reply: str,
+        data: Dict[str, Any],
+        started: float,
+        model: str,
+        history_turns: int,
+        first_chunk: float | None = None,
+    ) -> None:
+        if reply:
+            self.turns.append((step, content, reply, model))
+        entry = {
+            "step": step,
+            "model": model,
+            "history_turns": history_turns,
+            "prompt_eval_count": data.get("prompt_eval_count"),
+            "prompt_eval_ms": _ns_to_ms(data.get("prompt_eval_duration")),
+            "eval_count": data.get("eval_count"),
+            "eval_ms": _ns_to_ms(data.get("eval_duration")),
+            "load_ms": _ns_to_ms(data.get("load_duration")),
+            "first_chunk_ms": (first_chunk - started) * 1000.0 if first_chunk else None,
+            "wall_ms": (time.perf_counter() - started) * 1000.0,
+        }
+        self.stats.append(entry)
+        print(
+            f"[ollama] {step} ({model}): prompt_eval_count={entry['prompt_eval_count']} "
+            f"prompt_eval_ms={entry['prompt_eval_ms']} wall_ms={entry['wall_ms']:.0f}"
+        )
+
+    def remember(self, step: str, content: str, reply: str, model: str | None = None) -> None:
+        """Set ``step``'s turn in the history, e.g. to the part of a stream the caller used."""
+        self.turns = [t for t in self.turns if t[0] != step]
+        self.turns.append((step, content, reply, model or self.model))
+
+    def chat(
+        self,
+        step: str,
+        content: str,
+        format: str | dict | None = None,
+        model: str | None = None,
+        temperature: float | None = 0.4,
+        timeout: float = LLM_TIMEOUT_S,
+    ) -> str:
+        """
+        One step of the conversation. ``model`` overrides the session's
+        default for this call; only that model's earlier turns are sent.
+        """
+        model = model or self.model
+        started = time.perf_counter()
+        messages = self._messages(step, content, model)
+        payload = _chat_payload(messages, model, False, format, self.keep_alive, temperature)
+        data = _post_chat(payload, timeout)
+        reply = data.get("message", {}).get("content", "") or ""
+        self._record(step, content, reply, data, started, model, (len(messages) - 2) // 2)
+        return reply
+
+    def chat_stream(
+        self,
+        step: str,
+        content: str,
+        model: str | None = None,
+        temperature: float | None = 0.4,
+        timeout: float = LLM_TIMEOUT_S,
+    ) -> Iterator[str]:
+        """
+        Like ``chat`` but yields chunks. The reply joins the history only if
+        the stream ran to completion; see ``remember`` for early closes.
+        """
+        model = model or self.model
+        started = time.perf_counter()
+        messages = self._messages(step, content, model)
+        payload = _chat_payload(messages, model, True, None, self.keep_alive, temperature)
+        stream = _iter_chat_stream(payload, timeout)
+        parts: List[str] = []
+        final: Dict[str, Any] = {}
+        first_chunk = None
+        try:
+            for data in stream:
+                chunk = data.get("message", {}).get("content", "")
+                if chunk:
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter()
+                    parts.append(chunk)
+                    yield chunk
+                if data.get("done"):
+                    final = data
+        finally:
+            stream.close()
+            self._record(
+                step, content, "".join(parts) if final else "", final, started, model,
+                (len(messages) - 2) // 2, first_chunk,
+            )
+
+    def totals(self) -> Dict[str, float]:
+        """Prompt tokens / ms evaluated over the session (calls with counters)."""
+        counted = [s for s in self.stats if s["prompt_eval_count"] is not None]
+        return {
+            "calls": float(len(self.stats)),
+            "prompt_eval_count": float(sum(s["prompt_eval_count"] for s in counted)),
+            "prompt_eval_ms": sum(s["prompt_eval_ms"] or 0.0 for s in counted),
+            "wall_ms": sum(s["wall_ms"] for s in self.stats),
+        }
+
+
+# ---------------------------------------------------------------------
+# Per-flow model routing (config/flows.yaml + config/agents.yaml)
+# ---------------------------------------------------------------------
+CONFIG_DIR = Path(__file__).resolve().parent / "config"
+
+# Used when a flow has no config (or PyYAML is unavailable).
+DEFAULT_ROUTE = {"models": ["llama3"], "temperature": 0.4}
+
+_ROUTES: Dict[str, Dict[str, Any]] | None = None
+
+# (flow, model) -> calls / failures / total_ms; flow -> requests / escalations
+_MODEL_STATS: Dict[Tuple[str, str], Dict[str, float]] = {}
+_FLOW_STATS: Dict[str, Dict[str, float]] = {}
+
+
+def _read_yaml(path: Path) -> Dict[str, Any]:
+    try:
+        import yaml  # deferred: crewAI's dependency, only needed for routing
+    except ImportError:
+        return {}
+    if not path.exists():
+        return {}
+    with path.open("r", encoding="utf-8") as f:
+        return yaml.safe_load(f) or {}
+
+
+def _load_routes() -> Dict[str, Dict[str, Any]]:
+    global _ROUTES
+    if _ROUTES is not None:
+        return _ROUTES
+
+    agents = _read_yaml(CONFIG_DIR / "agents.yaml")
+    flows = _read_yaml(CONFIG_DIR / "flows.yaml")
+    routes: Dict[str, Dict[str, Any]] = {}
+    for flow, cfg in flows.items():
+        cfg = cfg or {}
+        agent = agents.get(cfg.get("agent") or "", {}) or {}
+        models = list(cfg.get("models") or [agent.get("llm") or DEFAULT_ROUTE["models"][0]])
+        temperature = cfg.get("temperature", agent.get("temperature", DEFAULT_ROUTE["temperature"]))
+        routes[flow] = {"models": [str(m) for m in models], "temperature": temperature}
+    _ROUTES = routes
+    return _ROUTES
+
+
+def flow_route(flow: str) -> Dict[str, Any]:
+    """``{"models": [cascade...], "temperature": float}`` for a flow."""
+    route = dict(_load_routes().get(flow) or DEFAULT_ROUTE)
+    env = os.environ.get(f"DOCTOR_PATIENT_MODELS_{flow.upper()}", "")
+    if env.strip():
+        route["models"] = [m.strip() for m in env.split(",") if m.strip()]
+    return route
+
+
+def _step_deadline(step: str) -> float | None:
+    """``time.monotonic()`` deadline for a step starting now (None: no budget)."""
+    budget = STEP_BUDGET_S.get(step, 0.0)
+    return time.monotonic() + budget if budget > 0 else None
+
+
+def _run_cascade(
+    flow: str,
+    attempt: Callable[[str, float | None, float], Tuple[Any, bool]],
+    deadline: float | None = None,
+) -> Any:
+    """
+    Call ``attempt(model, temperature, timeout) -> (result, valid)`` for each
+    model of the flow's cascade until one is valid; returns the last result
+    (None if ``deadline`` passed before any model was tried). Each call's
+    timeout is what is left of the deadline.
+    """
+    route = flow_route(flow)
+    models = route["models"]
+    result = None
+    tried = 0
+    for i, model in enumerate(models):
+        timeout = LLM_TIMEOUT_S
+        if deadline is not None:
+            timeout = min(timeout, deadline - time.monotonic())
+            if timeout <= 0:
+                print(f"[routing] {flow}: step budget spent before trying {model}")
+                break
+        if i:
+            print(f"[routing] {flow}: {models[i - 1]} reply failed validation; escalating to {model}")
+
+        tried += 1
+        started = time.perf_counter()
+        result, valid = attempt(model, route["temperature"], timeout)
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+
+        stats = _MODEL_STATS.setdefault((flow, model), {"calls": 0, "failures": 0, "total_ms": 0.0})
+        stats["calls"] += 1
+        stats["total_ms"] += elapsed_ms
+        if valid:
+            break
+        stats["failures"] += 1
+
+    flow_stats = _flow_stats(flow)
+    flow_stats["requests"] += 1
+    flow_stats["escalations"] += max(tried - 1, 0)
+    return result
+
+
+def _flow_stats(flow: str) -> Dict[str, float]:
+    return _FLOW_STATS.setdefault(flow, {"requests": 0, "escalations": 0, "fallbacks": 0})
+
+
+def routing_stats() -> Dict[str, Any]:
+    """Per-model latency / failure rate; per-flow escalation and fallback rate."""
+    models = {}
+    for (flow, model), s in sorted(_MODEL_STATS.items()):
+        models[f"{flow}/{model}"] = {
+            **s,
+            "avg_ms": s["total_ms"] / s["calls"] if s["calls"] else 0.0,
+            "failure_rate": s["failures"] / s["calls"] if s["calls"] else 0.0,
+        }
+    flows = {}
+    for flow, s in sorted(_FLOW_STATS.items()):
+        flows[flow] = {
+            **s,
+            "escalation_rate": s["escalations"] / s["requests"] if s["requests"] else 0.0,
+            "fallback_rate": s["fallbacks"] / s["requests"] if s["requests"] else 0.0,
+        }
+    return {"models": models, "flows": flows}
 
 
 # ---------------------------------------------------------------------
-# Helper: pull JSON out of messy LLM output
+# Helper: pull JSON out of messy (possibly still streaming) LLM output
 # ---------------------------------------------------------------------
+_SCAN_RE = re.compile(r'[{}\[\]"\\]')
+
+
+class _JsonStreamScanner:
+    """
+    Incremental balanced-brace scanner for JSON objects embedded in LLM text.
+
+    Feed it response chunks as they arrive; every top-level ``{...}`` that
+    closes and parses as a JSON object is returned from ``feed``. Brackets
+    are only tracked inside a candidate object, with string/escape state, so
+    prose, code fences and braces inside strings don't confuse it. Each
+    character is scanned once unless a candidate turns out not to be JSON,
+    in which case scanning resumes just after its opening brace.
+
+    With ``watch_key``, ``{watch_key: [...]}`` is also returned the moment
+    that array closes in the outermost object, before trailing keys/prose.
+    """
+
+    # Candidates abandoned before giving up; bounds pathological inputs
+    # (e.g. thousands of unbalanced "{") to linear-ish work.
+    MAX_RESTARTS = 16
+
+    def __init__(self, watch_key: str | None = None) -> None:
+        self.text = ""
+        self._watch_key = watch_key
+        self._watch_re = (
+            re.compile(r'"%s"\s*:\s*$' % re.escape(watch_key)) if watch_key else None
+        )
+        self._watch_done = False
+        self._restarts = 0
+        self._reset(0)
+
+    def _reset(self, pos: int) -> None:
+        self._pos = pos
+        self._skip = pos
+        self._stack: List[str] = []
+        self._start = -1
+        self._in_str = False
+        self._arr_start = -1
+
+    def feed(self, chunk: str) -> List[dict]:
+        self.text += chunk or ""
+        return self._scan()
+
+    def finish(self) -> List[dict]:
+        """Call at end of stream: retry past stray, never-closed braces."""
+        out: List[dict] = []
+        while self._stack and self._restart():
+            out.extend(self._scan())
+        return out
+
+    def _restart(self) -> bool:
+        """Abandon the current candidate and rescan just after its brace."""
+        self._restarts += 1
+        if self._restarts > self.MAX_RESTARTS:
+            self._reset(len(self.text))
+            return False
+        self._reset(self._start + 1)
+        return True
+
+    def _scan(self) -> List[dict]:
+        out: List[dict] = []
+        text = self.text
+        restart = True
+        while restart:
+            restart = False
+            for m in _SCAN_RE.finditer(text, self._pos):
+                i = m.start()
+                if i < self._skip:
+                    continue
+                ch = m.group()
+
+                if self._in_str:
+                    if ch == "\\":
+                        self._skip = i + 2
+                    elif ch == '"':
+                        self._in_str = False
+                    continue
+
+                if not self._stack:
+                    if ch == "{":
+                        self._stack.append("{")
+                        self._start = i
+                    continue
+
+                if ch == '"':
+                    self._in_str = True
+                elif ch in "{[":
+                    if (
+                        ch == "["
+                        and self._watch_re is not None
+                        and not self._watch_done
+                        and len(self._stack) == 1
+                        and self._watch_re.search(text, max(self._start, i - 256), i)
+                    ):
+                        self._arr_start = i
+                    self._stack.append(ch)
+                else:
+                    if self._stack[-1] != ("{" if ch == "}" else "["):
+                        # Mismatched bracket: this candidate isn't JSON.
+                        restart = self._restart()
+                        break
+                    self._stack.pop()
+
+                    if ch == "]" and self._arr_start >= 0 and len(self._stack) == 1:
+                        try:
+                            value = json.loads(text[self._arr_start:i + 1])
+                        except ValueError:
+                            value = None
+                        self._arr_start = -1
+                        if isinstance(value, list):
+                            self._watch_done = True
+                            out.append({self._watch_key: value})
+
+                    if not self._stack:
+                        try:
+                            obj = json.loads(text[self._start:i + 1])
+                        except ValueError:
+                            obj = None
+                        if not isinstance(obj, dict):
+                            restart = self._restart()
+                            break
+                        out.append(obj)
+                        self._start = -1
+            else:
+                self._pos = len(text)
+        return out
+
+
 def _extract_json_dict(raw: str) -> dict | None:
-    """Try to pull a JSON object out of an LLM response that may contain text + code blocks."""
+    """Pull the first JSON object out of an LLM response that may contain text + code blocks."""
     raw = (raw or "").strip()
     if not raw:
         return None
 
-    # 1) Maybe it's already pure JSON
-    try:
-        return json.loads(raw)
-    except Exception:
-        pass
-
-    # 2) Look for ```json ...``` or ``` ...``` fenced block
-    m = re.search(r"```(?:json)?\s*({.*?})\s*```", raw, flags=re.DOTALL)
-    if m:
-        candidate = m.group(1)
+    # Pure JSON (e.g. Ollama format/schema mode) needs no scanning.
+    if raw[0] == "{":
         try:
-            return json.loads(candidate)
-        except Exception:
+            data = json.loads(raw)
+            if isinstance(data, dict):
+                return data
+        except ValueError:
             pass
 
-    # 3) Fallback: first {...} anywhere
-    m = re.search(r"\{.*\}", raw, flags=re.DOTALL)
-    if m:
-        candidate = m.group(0)
-        try:
-            return json.loads(candidate)
-        except Exception:
-            pass
+    scanner = _JsonStreamScanner()
+    found = scanner.feed(raw) + scanner.finish()
+    return found[0] if found else None
+
+
+def _first_json_dict(
+    chunks: Iterator[str],
+    watch_key: str | None = None,
+) -> Tuple[dict | None, str]:
+    """
+    Consume streamed chunks until a JSON object (one containing
+    ``watch_key``, if given) is complete, then stop reading the stream.
+    Returns ``(object or None, text received so far)``.
+    """
+    scanner = _JsonStreamScanner(watch_key)
+    first: dict | None = None
+    try:
+        for chunk in chunks:
+            for obj in scanner.feed(chunk):
+                if watch_key is None or watch_key in obj:
+                    return obj, scanner.text
+                first = first or obj
+        for obj in scanner.finish():
+            if watch_key is None or watch_key in obj:
+                return obj, scanner.text
+            first = first or obj
+    finally:
+        close = getattr(chunks, "close", None)
+        if close is not None:
+            close()
+    return first, scanner.text
+
+
+# ---------------------------------------------------------------------
+# Results tagged with the path that served them
+# ---------------------------------------------------------------------
+# ``served_by``: "llm", "tier" (materialized symptom options) or "retrieval"
+# (LLM missed its budget or failed). They behave as the plain list / str
+# the flows always returned.
+
+class ServedList(list):
+    def __init__(self, items: Iterable[str] = (), served_by: str = "llm") -> None:
+        super().__init__(items)
+        self.served_by = served_by
+
+
+class ServedText(str):
+    served_by: str
 
-    return None
+    def __new__(cls, text: str, served_by: str = "llm") -> "ServedText":
+        obj = super().__new__(cls, text)
+        obj.served_by = served_by
+        return obj
+
+
+def retrieval_symptom_options(chief_complaint: str, limit: int = 5) -> List[str]:
+    """
+    Symptom options from the most similar cases alone (no LLM): their
+    symptom phrases only. A case's ``name`` is its chief complaint (e.g.
+    "Abnormal labs") or a dialogue snippet, not a symptom.
+    """
+    options: List[str] = []
+    for cand in get_candidate_symptoms_for_chief_complaint(chief_complaint):
+        for phrase in cand.get("symptoms") or []:
+            if not isinstance(phrase, str):
+                continue
+            phrase = phrase.strip()
+            if phrase and phrase not in options:
+                options.append(phrase)
+    return options[:limit]
 
 
 # ---------------------------------------------------------------------
 # SYMPTOM FLOW
 # ---------------------------------------------------------------------
-def run_symptom_flow(chief_complaint: str) -> List[str]:
+def run_symptom_flow(
+    chief_complaint: str,
+    session: OllamaSession | None = None,
+) -> List[str]:
     """
-    Given a free-text chief complaint, use train_subjective.json via
-    get_dialogues_and_raw_for_chief_complaint to find similar dialogues,
-    then ask the LLM to propose symptom phrases.
+    Given a free-text chief complaint, propose symptom phrases.
+
+    Complaints close enough to a frequent corpus cluster are served from the
+    materialized tier (tools/symptom_tier.py) without an LLM call; the rest
+    go through generate_symptom_options. Pass the wizard's ``session`` so
+    later steps reuse this prompt.
 
     Returns a list of strings suitable for checkboxes.
     """
@@ -91,15 +741,58 @@ def run_symptom_flow(chief_complaint: str) -> List[str]:
     if not chief_complaint:
         return []
 
-    # 1) Get top similar dialogues from train_subjective.json
-    top_dialogues = get_dialogues_and_raw_for_chief_complaint(
+    started = time.perf_counter()
+    deadline = _step_deadline("symptom_options")
+    match = symptom_tier.lookup(chief_complaint)
+    if match is not None:
+        cluster, sim = match
+        symptom_tier.record(True, (time.perf_counter() - started) * 1000.0, cluster)
+        print(f"[symptom_tier] Served cluster {cluster['id']} {cluster['label']!r} (sim {sim:.2f})")
+        return ServedList(cluster["symptom_options"], "tier")
+
+    options = generate_symptom_options(chief_complaint, session, deadline)
+    symptom_tier.record(False, (time.perf_counter() - started) * 1000.0)
+    if options:
+        return ServedList(options, "llm")
+
+    # LLM down, too slow or unparseable: answer from retrieval alone.
+    _flow_stats("symptom_options")["fallbacks"] += 1
+    options = retrieval_symptom_options(chief_complaint)
+    print(f"[symptom_flow] No LLM options; serving {len(options)} retrieval-only options")
+    return ServedList(options, "retrieval")
+
+
+def generate_symptom_options(
+    chief_complaint: str,
+    session: OllamaSession | None = None,
+    deadline: float | None = None,
+) -> List[str]:
+    """
+    Use train_subjective.json via get_patient_turns_for_chief_complaint to
+    find similar dialogues, then ask the LLM to propose symptom phrases.
+    Returns [] when no model produced valid options before ``deadline``.
+    """
+    chief_complaint = (chief_complaint or "").strip()
+    if not chief_complaint:
+        return []
+
+    # 1) Get top similar dialogues from train_subjective.json, matched on
+    #    patient turns
+    top_dialogues = get_patient_turns_for_chief_complaint(
         chief_complaint,
         k=2,  # top 2 as you requested
     )
 
-    # Build a compact context for the LLM
+    # Build a compact context for the LLM: the matching turns, or a snippet
+    # of the dialogue for hits without a good enough turn
     dialog_snippets: List[str] = []
     for i, d in enumerate(top_dialogues, start=1):
+        turns = d.get("turns")
+        if turns:
+            text = "\n".join(f"[{t['speaker']}] {t['text']}" for t in turns)
+            dialog_snippets.append(f"--- DIALOGUE {i} (matching turns) ---\n{text}")
+            continue
+
         # Depending on your retrieval implementation, you may have keys like
         # "dialogue" or "src" or "raw"
         text = (
@@ -115,49 +808,61 @@ def run_symptom_flow(chief_complaint: str) -> List[str]:
 
     context_block = "\n\n".join(dialog_snippets) if dialog_snippets else "[none found]"
 
-    # 2) Prompt LLM to suggest co-occurring symptoms
-    prompt = f"""
-You are a clinical symptom extraction helper for a research-only prototype.
-You are given a patient's chief complaint and a few similar historical
-doctor–patient dialogues (from ACI-Bench).
+    # 2) Prompt LLM to suggest co-occurring symptoms (instructions are in
+    #    SYSTEM_PREFIX; only this step's data goes in the message)
+    prompt = f"""STEP: symptom_options
 
 Patient chief complaint:
 \"\"\"{chief_complaint}\"\"\"
 
 Similar historical dialogues:
 {context_block}
+"""
+    session = session or OllamaSession(keep_alive=None)
 
-Your task:
-
-1. Infer up to 5 short symptom phrases that could *reasonably co-occur*
-   with this patient's complaint, based on the patterns you see in the
-   similar dialogues.
-2. Each phrase must be concise (<= 12 words).
-3. Do not mention diagnoses or treatments, only *symptoms* or *feelings*.
-4. Return ONLY a JSON object with this exact structure:
+    def attempt(model: str, temperature: float | None, timeout: float) -> Tuple[List[str], bool]:
+        options = _ask_symptom_options(session, prompt, model, temperature, timeout)
+        return options, bool(options)
 
-{{
-  "symptom_options": [
-    "symptom phrase 1",
-    "symptom phrase 2"
-  ]
-}}
+    # Small model first; escalate when its JSON doesn't parse or validate.
+    return _run_cascade("symptom_options", attempt, deadline) or []
 
-You MAY include some explanation in natural language BEFORE the JSON,
-but the JSON block itself must be valid.
-"""
 
-    raw = ollama_chat(prompt)
-    data = _extract_json_dict(raw)
+def _ask_symptom_options(
+    session: OllamaSession,
+    prompt: str,
+    model: str,
+    temperature: float | None,
+    timeout: float = LLM_TIMEOUT_S,
+) -> List[str]:
+    """One model's symptom options ([] when the reply isn't valid JSON)."""
+    if SYMPTOM_OUTPUT_MODE == "schema":
+        raw = session.chat(
+            "symptom_options", prompt, SYMPTOM_OPTIONS_SCHEMA, model, temperature, timeout
+        )
+        data = _extract_json_dict(raw)
+    elif SYMPTOM_OUTPUT_MODE == "stream":
+        data, raw = _first_json_dict(
+            session.chat_stream("symptom_options", prompt, model, temperature, timeout),
+            watch_key="symptom_options",
+        )
+        if data is not None:
+            # The stream was cut once the options closed; keep the object as the reply.
+            session.remember("symptom_options", prompt, json.dumps(data, ensure_ascii=False), model)
+    else:
+        raw = session.chat(
+            "symptom_options", prompt, model=model, temperature=temperature, timeout=timeout
+        )
+        data = _extract_json_dict(raw)
 
     if data is None:
-        print("[symptom_flow] Failed to parse JSON:", repr(raw)[:300])
+        print(f"[symptom_flow] {model}: failed to parse JSON:", repr(raw)[:300])
 
         return []
 
     opts = data.get("symptom_options") or []
     if not isinstance(opts, list):
-        print(f"[symptom_flow] symptom_options is not a list: {data!r}")
+        print(f"[symptom_flow] {model}: symptom_options is not a list: {data!r}")
         return []
 
     cleaned: List[str] = []
@@ -177,14 +882,18 @@ def run_drug_flow(chief_complaint: str, selected_symptoms: List[str]) -> List[st
     """
     Given confirmed symptoms, return candidate drug names using your
     existing retrieval logic (likely from train_full.json).
+
+    Drugs the patient already named in the complaint (matched against the
+    medication lexicon, brand names normalized to generics) come first.
     """
     selected_symptoms = selected_symptoms or []
-    if not selected_symptoms:
+    mentioned = extract_medications(chief_complaint or "")
+    if not selected_symptoms and not mentioned:
         return []
 
     candidates = get_candidate_drugs_for_symptoms(selected_symptoms)
 
-    seen: List[str] = []
+    seen: List[str] = list(mentioned)
     for c in candidates:
         name = c.get("name")
         if isinstance(name, str):
@@ -202,11 +911,17 @@ def run_summary_flow(
     chief_complaint: str,
     selected_symptoms: List[str],
     selected_drugs: List[str],
+    session: OllamaSession | None = None,
 ) -> str:
     """
     Generate a SOAP-style summary using similar cases (retrieval) + llama3
     via Ollama. This is still a research-only, non-medical tool.
+
+    With the wizard's ``session`` the symptom step's prompt is reused. If
+    the LLM misses the step's budget (or fails), the note is a template
+    filled from the similar cases; ``served_by`` tells which.
     """
+    deadline = _step_deadline("summary")
     chief_complaint = (chief_complaint or "").strip()
     selected_symptoms = selected_symptoms or []
     selected_drugs = selected_drugs or []
@@ -236,10 +951,7 @@ def run_summary_flow(
             }
         )
 
-    prompt = f"""
-You are a medical documentation assistant (RESEARCH DEMO ONLY — NOT MEDICAL ADVICE).
-
-Write a compact SOAP-style note from the following information.
+    prompt = f"""STEP: summary
 
 Chief complaint:
 {chief_complaint or "[not provided]"}
@@ -252,43 +964,116 @@ Confirmed medications / drug history:
 
 Similar cases (compact JSON view):
 {json.dumps(compact, ensure_ascii=False)}
+"""
 
-Requirements:
+    session = session or OllamaSession(keep_alive=None)
 
-### Subjective
-- 1–3 sentences combining chief complaint and key symptoms.
+    def attempt(model: str, temperature: float | None, timeout: float) -> Tuple[str, bool]:
+        reply = session.chat(
+            "summary", prompt, model=model, temperature=temperature, timeout=timeout
+        )
+        return reply, bool(reply.strip())
 
-### Objective
-- Describe which exams/tests are *typically* done (vital signs, labs, imaging, etc.)
-- Do NOT invent specific numeric values.
+    text = (_run_cascade("summary", attempt, deadline) or "").strip()
+    if text:
+        return ServedText(text, "llm")
 
-### Assessment
-- Generic, no diagnosis. Example style:
-  "Symptoms suggest a possible acute condition, but further evaluation is needed."
+    _flow_stats("summary")["fallbacks"] += 1
+    print("[summary_flow] No LLM summary; serving the retrieval-only template")
+    return ServedText(
+        template_soap_note(chief_complaint, selected_symptoms, selected_drugs, similar_cases),
+        "retrieval",
+    )
 
-### Plan
-- Only HIGH-LEVEL actions such as:
-  - book appointment with a primary care physician
-  - consider physical examination
-  - clinician may consider lab tests or imaging
-- Do NOT recommend specific drugs or doses.
-- Do NOT give emergency / triage advice.
-- Do NOT talk directly to the patient; write as a neutral note.
-"""
 
-    text = ollama_chat(prompt)
-    text = (text or "").strip()
-
-    if not text:
-        return (
-            "### Subjective\n"
-            "_No summary generated (model returned empty response)._  \n\n"
-            "### Objective\n"
-            "_Not available._\n\n"
-            "### Assessment\n"
-            "_Not available._\n\n"
-            "### Plan\n"
-            "_Please contact a qualified clinician for a real medical assessment._"
+def template_soap_note(
+    chief_complaint: str,
+    selected_symptoms: List[str],
+    selected_drugs: List[str],
+    similar_cases: List[Dict[str, Any]],
+) -> str:
+    """SOAP note assembled from the inputs and similar cases, no LLM."""
+    def listing(items: List[str]) -> str:
+        return ", ".join(items) if items else "none confirmed"
+
+    subjective = f"Patient reports {chief_complaint or 'no chief complaint provided'}"
+    subjective = subjective.rstrip(".") + ". "
+    subjective += f"Confirmed symptoms: {listing(selected_symptoms)}. "
+    subjective += f"Medication / drug history: {listing(selected_drugs)}."
+
+    similar_lines = []
+    for case in similar_cases:
+        cc = (
+            case.get("chief_complaint")
+            or _extract_chief_complaint_text((case.get("raw") or {}).get("tgt") or "")
+        )
+        if not cc:
+            # Nothing to say about a case whose note has no complaint.
+            continue
+        meds = case.get("medications") or []
+        similar_lines.append(
+            f"- {cc}" + (f" (medications on record: {', '.join(meds)})" if meds else "")
         )
 
-    return text
+    return (
+        "_Generated from similar cases without the language model "
+        "(it was unavailable or too slow)._\n\n"
+        "### Subjective\n"
+        f"{subjective}\n\n"
+        "### Objective\n"
+        "- Vital signs and a focused physical examination are typically documented.\n"
+        "- Labs or imaging may be considered depending on the examination.\n"
+        + ("- Similar cases on record:\n  " + "\n  ".join(similar_lines) + "\n" if similar_lines else "")
+        + "\n### Assessment\n"
+        "Symptoms suggest a condition that needs further evaluation by a clinician.\n\n"
+        "### Plan\n"
+        "- Book an appointment with a primary care physician.\n"
+        "- Clinician may consider a physical examination, lab tests or imaging.\n\n"
+        "_Please contact a qualified clinician for a real medical assessment._"
+    )
+
+
+# ---------------------------------------------------------------------
+# Measuring prompt reuse
+# ---------------------------------------------------------------------
+def measure_prompt_reuse(
+    chief_complaint: str,
+    selected_symptoms: List[str],
+    selected_drugs: List[str],
+) -> Dict[str, Dict[str, float]]:
+    """
+    Run the symptom and summary steps twice against a live Ollama: once
+    with a fresh conversation per step, once in a single OllamaSession,
+    and compare the prompt tokens / time Ollama reports evaluating.
+
+    Steps routed to different models (config/flows.yaml) share no history,
+    so the session only saves prompt evaluation between steps on the same
+    model. Text output mode is used so every call returns its eval
+    counters. The symptom step calls generate_symptom_options directly, so
+    the symptom tier can't answer it without an LLM call.
+    """
+    global SYMPTOM_OUTPUT_MODE
+    saved_mode = SYMPTOM_OUTPUT_MODE
+    SYMPTOM_OUTPUT_MODE = "text"
+    try:
+        per_step = [OllamaSession(), OllamaSession()]
+        generate_symptom_options(chief_complaint, per_step[0])
+        run_summary_flow(chief_complaint, selected_symptoms, selected_drugs, per_step[1])
+
+        shared = OllamaSession()
+        generate_symptom_options(chief_complaint, shared)
+        run_summary_flow(chief_complaint, selected_symptoms, selected_drugs, shared)
+    finally:
+        SYMPTOM_OUTPUT_MODE = saved_mode
+
+    fresh = [s.totals() for s in per_step]
+    result = {
+        "per_step": {key: fresh[0][key] + fresh[1][key] for key in fresh[0]},
+        "session": shared.totals(),
+    }
+    for label, t in result.items():
+        print(
+            f"[ollama] {label}: {t['prompt_eval_count']:.0f} prompt tokens evaluated "
+            f"in {t['prompt_eval_ms']:.0f} ms ({t['wall_ms']:.0f} ms wall)"
+        )
+    return result
@@ -0,0 +1,340 @@
+#!/usr/bin/env python
+"""
+Retrieval quality-versus-latency evaluation on ACI-Bench splits.
+
+    python -m doctor_patient.eval_retrieval [--k 5] [--shards N] [--json out.json]
+
+Queries are the CHIEF COMPLAINT lines of the notes (``tgt``) in
+train_full.json, plus valid_full.json / clinicalnlp_taskB_test1_full.json
+when they are present in src/data. Each query is run through
+``get_dialogues_and_raw_for_chief_complaint`` under every backend
+configuration in BACKENDS.
+
+Relevance labels come from the notes too: a corpus case is relevant to a
+query case when their CHIEF COMPLAINT + ASSESSMENT vocabularies overlap
+(Jaccard >= REL_THRESHOLD), and that overlap is the graded gain for nDCG.
+On the train split a query's own case is excluded from its results.
+
+One table reports recall@k, MRR and nDCG@k next to p50/p99 latency and the
+peak memory of a cold start (corpus load, index build, first queries).
+Rows marked "*" are Pareto-optimal on (nDCG, p99 latency, memory).
+Sharded rows have no memory figure (the shards' memory lives in other
+processes and tracemalloc sees only the coordinator's), so they are left
+out of the Pareto comparison.
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import math
+import re
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Set
+
+from .tools import retrieval
+
+SPLIT_FILES = {
+    "train": "train_full.json",
+    "valid": "valid_full.json",
+    "test": "clinicalnlp_taskB_test1_full.json",
+}
+
+# Module attributes of tools.retrieval to override per configuration.
+BACKENDS: Dict[str, Dict[str, Any]] = {
+    "jaccard": {"SCORER": "jaccard", "TOP_K_PRUNING": False},
+    "jaccard+maxscore": {"SCORER": "jaccard", "TOP_K_PRUNING": True, "TOP_K_PRUNING_MIN_DOCS": 0},
+    "bm25": {"SCORER": "bm25", "TOP_K_PRUNING": False},
+    "bm25+maxscore": {"SCORER": "bm25", "TOP_K_PRUNING": True, "TOP_K_PRUNING_MIN_DOCS": 0},
+    "jaccard/turns": {"SCORER": "jaccard", "TURN_SCORER": "jaccard", "RETRIEVAL_UNIT": "turn"},
+    "bm25/turns": {"SCORER": "bm25", "TURN_SCORER": "bm25", "RETRIEVAL_UNIT": "turn"},
+}
+
+# Backends also run with --shards. Only the scorer travels in the /search
+# request; pruning and turn overrides would reach the coordinator alone and
+# print the plain scorer's results under their name.
+SHARD_BACKENDS = ("jaccard", "bm25")
+
+# Minimum label overlap for a case to count as relevant.
+REL_THRESHOLD = 0.1
+
+_LABEL_SECTIONS = ("CHIEF COMPLAINT", "ASSESSMENT", "ASSESSMENT AND PLAN", "IMPRESSION")
+
+_HEADING_RE = re.compile(r"^[A-Z][A-Z ,&/]{3,}$")
+
+_LABEL_STOPWORDS = {
+    "the", "and", "for", "with", "that", "this", "was", "were", "are", "has",
+    "have", "had", "not", "but", "she", "her", "his", "him", "they", "them",
+    "will", "would", "should", "can", "may", "been", "from", "into", "out",
+    "patient", "patients", "history", "follow", "up", "follow-up", "today",
+    "also", "any", "some", "about", "over", "well", "which", "who", "our",
+    "their", "there", "then", "than", "other", "all", "due", "per", "plan",
+    "assessment", "recommend", "recommended", "discussed", "continue",
+    "medical", "reasoning", "education", "counseling", "treatment", "presents",
+    "understands", "agrees", "agreement", "agreements", "questions", "answered",
+    "encouraged", "advised", "options", "risks", "benefits", "alternatives",
+}
+
+
+def note_sections(tgt: str) -> Dict[str, str]:
+    """Split a note into ``{HEADING: body}`` on all-caps heading lines."""
+    sections: Dict[str, List[str]] = {}
+    current = ""
+    for line in (tgt or "").splitlines():
+        stripped = line.strip()
+        if _HEADING_RE.match(stripped):
+            current = stripped
+            sections.setdefault(current, [])
+        elif current:
+            sections[current].append(line)
+    return {h: "\n".join(body).strip() for h, body in sections.items()}
+
+
+def label_terms(tgt: str) -> Set[str]:
+    sections = note_sections(tgt)
+    text = " ".join(sections.get(h, "") for h in _LABEL_SECTIONS)
+    return {
+        t for t in retrieval._tokenize(text)
+        if len(t) > 2
+        and not t.isdigit()
+        and "year-old" not in t
+        and t not in _LABEL_STOPWORDS
+    }
+
+
+def _overlap(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+def load_split(name: str) -> List[Dict[str, Any]]:
+    path = retrieval.DATA_DIR / SPLIT_FILES[name]
+    if not path.exists():
+        return []
+    return [
+        item for item in retrieval._iter_json_items(path)
+        if isinstance(item, dict) and item.get("tgt")
+    ]
+
+
+@contextmanager
+def backend(overrides: Dict[str, Any]) -> Iterator[None]:
+    """Apply retrieval module overrides and start from cold caches."""
+    saved = {name: getattr(retrieval, name) for name in overrides}
+    for name, value in overrides.items():
+        setattr(retrieval, name, value)
+    retrieval._SUBJ_CASES = None
+    retrieval._INDEX = None
+    retrieval._TURN_INDEX = None
+    retrieval._COOCCUR = None
+    retrieval._MED_LEXICON = None
+    retrieval._MED_MATCHER = None
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(retrieval, name, value)
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Nearest-rank percentile (``q`` in [0, 1]); 0.0 for no values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    idx = min(len(ordered) - 1, max(0, math.ceil(q * len(ordered)) - 1))
+    return ordered[idx]
+
+
+def evaluate(
+    queries: List[Dict[str, Any]],
+    k: int = 5,
+    backends: Dict[str, Dict[str, Any]] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    ``queries``: ``{"split", "text", "terms", "src"}`` dicts. Returns one row
+    of metrics per backend.
+    """
+    backends = backends or BACKENDS
+    # One streamed pass over the corpus; only ids, sources and labels kept.
+    corpus = [
+        (c["id"], c["raw"].get("src"), label_terms(c["raw"].get("tgt") or ""))
+        for c in retrieval.iter_subjective_cases()
+    ]
+
+    # Graded relevance of every corpus case for every query (self excluded).
+    judged = []
+    for q in queries:
+        gains = {}
+        for case_id, src, terms in corpus:
+            if src == q["src"]:
+                continue
+            g = _overlap(q["terms"], terms)
+            if g >= REL_THRESHOLD:
+                gains[case_id] = g
+        judged.append(gains)
+
+    rows = []
+    for name, overrides in backends.items():
+        with backend(overrides):
+            # Cold start under tracemalloc: index build + one pass of queries.
+            tracemalloc.start()
+            retrieval.build_stores()
+            for q in queries[:20]:
+                retrieval.get_dialogues_and_raw_for_chief_complaint(q["text"], k=k + 1)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            # Untimed warm pass so p99 reflects steady state, not first-touch.
+            for q in queries:
+                retrieval.get_dialogues_and_raw_for_chief_complaint(q["text"], k=k + 1)
+            gc.collect()
+
+            latencies: List[float] = []
+            recalls: List[float] = []
+            rrs: List[float] = []
+            ndcgs: List[float] = []
+            for q, gains in zip(queries, judged):
+                t0 = time.perf_counter()
+                hits = retrieval.get_dialogues_and_raw_for_chief_complaint(q["text"], k=k + 1)
+                latencies.append((time.perf_counter() - t0) * 1000.0)
+
+                ranked = [h["id"] for h in hits if h["raw"].get("src") != q["src"]][:k]
+                if not gains:
+                    continue
+
+                # Denominator capped at k so a perfect top-k scores 1.0.
+                found = [cid for cid in ranked if cid in gains]
+                recalls.append(len(found) / min(len(gains), k))
+                rrs.append(next((1.0 / (i + 1) for i, cid in enumerate(ranked) if cid in gains), 0.0))
+
+                dcg = sum(gains.get(cid, 0.0) / math.log2(i + 2) for i, cid in enumerate(ranked))
+                ideal = sorted(gains.values(), reverse=True)[:k]
+                idcg = sum(g / math.log2(i + 2) for i, g in enumerate(ideal))
+                ndcgs.append(dcg / idcg if idcg else 0.0)
+
+        rows.append(
+            {
+                "backend": name,
+                "queries": len(queries),
+                "judged": len(recalls),
+                f"recall@{k}": statistics.fmean(recalls) if recalls else 0.0,
+                "mrr": statistics.fmean(rrs) if rrs else 0.0,
+                f"ndcg@{k}": statistics.fmean(ndcgs) if ndcgs else 0.0,
+                "p50_ms": percentile(latencies, 0.50),
+                "p99_ms": percentile(latencies, 0.99),
+                # Only the coordinator is traced; shard memory isn't comparable.
+                "peak_mem_mb": None if overrides.get("SHARD_URLS") else peak / 1e6,
+            }
+        )
+
+    _mark_pareto(rows, f"ndcg@{k}")
+    return rows
+
+
+def _mark_pareto(rows: List[Dict[str, Any]], quality: str) -> None:
+    def dominates(a: Dict[str, Any], b: Dict[str, Any]) -> bool:
+        no_worse = (
+            a[quality] >= b[quality]
+            and a["p99_ms"] <= b["p99_ms"]
+            and a["peak_mem_mb"] <= b["peak_mem_mb"]
+        )
+        better = (
+            a[quality] > b[quality]
+            or a["p99_ms"] < b["p99_ms"]
+            or a["peak_mem_mb"] < b["peak_mem_mb"]
+        )
+        return no_worse and better
+
+    measured = [r for r in rows if r["peak_mem_mb"] is not None]
+    for r in rows:
+        r["pareto"] = r in measured and not any(dominates(o, r) for o in measured if o is not r)
+
+
+def build_queries(splits: List[str]) -> List[Dict[str, Any]]:
+    queries = []
+    for split in splits:
+        for item in load_split(split):
+            text = retrieval._extract_chief_complaint_text(item["tgt"])
+            if not text:
+                continue
+            queries.append(
+                {
+                    "split": split,
+                    "text": text,
+                    "terms": label_terms(item["tgt"]),
+                    "src": item.get("src"),
+                }
+            )
+    return queries
+
+
+def format_table(rows: List[Dict[str, Any]], k: int) -> str:
+    cols = [
+        ("backend", 22, "{:<22}"),
+        ("judged", 6, "{:>6}"),
+        (f"recall@{k}", 9, "{:>9.3f}"),
+        ("mrr", 6, "{:>6.3f}"),
+        (f"ndcg@{k}", 7, "{:>7.3f}"),
+        ("p50_ms", 8, "{:>8.3f}"),
+        ("p99_ms", 8, "{:>8.3f}"),
+        ("peak_mem_mb", 11, "{:>11.2f}"),
+    ]
+    header = "  ".join(
+        name.ljust(width) if name == "backend" else name.rjust(width)
+        for name, width, _ in cols
+    ) + "  pareto"
+    lines = [header, "-" * len(header)]
+    for r in rows:
+        lines.append(
+            "  ".join(
+                fmt.format(r[name]) if r[name] is not None else "-".rjust(width)
+                for name, width, fmt in cols
+            )
+            + ("  *" if r["pareto"] else "")
+        )
+    return "\n".join(lines)
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Evaluate retrieval quality vs latency.")
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--splits", nargs="+", default=list(SPLIT_FILES), choices=list(SPLIT_FILES))
+    parser.add_argument(
+        "--shards", type=int, default=0,
+        help="Also evaluate SHARD_BACKENDS as scatter-gather over N local shard processes.",
+    )
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args(argv)
+
+    queries = build_queries(args.splits)
+    if not queries:
+        raise SystemExit("No queries: none of the requested splits are in src/data.")
+    print(f"[eval] {len(queries)} queries from {sorted({q['split'] for q in queries})}")
+
+    backends = dict(BACKENDS)
+    procs = []
+    if args.shards > 0:
+        from .tools import shard_server
+
+        procs, urls = shard_server.spawn_local_shards(args.shards)
+        for name in SHARD_BACKENDS:
+            backends[f"{name}@{args.shards}-shards"] = {**BACKENDS[name], "SHARD_URLS": urls}
+
+    try:
+        rows = evaluate(queries, args.k, backends)
+    finally:
+        for p in procs:
+            p.terminate()
+
+    print(format_table(rows, args.k))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(rows, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+#!/usr/bin/env python
+"""
+Import-time budget check and cold-start measurement.
+
+    python -m doctor_patient.importtime [--runs N] [--no-cold-start]
+
+1. For each module in IMPORT_BUDGETS_MS, runs ``python -X importtime`` in a
+   fresh interpreter and compares the module's cumulative import time with
+   its budget, listing the heaviest dependencies it pulled in.
+2. Measures wall-clock cold start for every ``[project.scripts]`` entry in
+   pyproject.toml and for streamlit_app.py, next to a bare ``python -c
+   pass`` baseline. Each script gets two numbers: importing its module,
+   and additionally running the imports inside the entry function, which
+   is what launching the command pays before its first real work.
+
+Exits non-zero when a module is over budget or an import / ready check
+fails, so it can gate CI.
+"""
+from __future__ import annotations
+
+import argparse
+import ast
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+PKG_DIR = Path(__file__).resolve().parent      # .../src/doctor_patient
+SRC_ROOT = PKG_DIR.parent                      # .../src
+PROJECT_DIR = SRC_ROOT.parent                  # .../ (pyproject.toml)
+
+# Cumulative import budgets (ms) for the modules every entry point loads.
+# crewai, requests and the process-pool/HTTP stack must stay out of these.
+IMPORT_BUDGETS_MS: Dict[str, float] = {
+    "doctor_patient.tools.retrieval": 80.0,
+    "doctor_patient.crew": 100.0,
+    "doctor_patient.main": 50.0,
+}
+
+_IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+
+def _env() -> Dict[str, str]:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (str(SRC_ROOT), env.get("PYTHONPATH")) if p)
+    return env
+
+
+def measure_import(module: str, runs: int = 3) -> Tuple[float | None, List[Tuple[str, float]], str]:
+    """
+    Best-of-``runs`` cumulative import time of ``module`` in ms, its five
+    heaviest transitive imports, and an error message if it failed.
+    """
+    best: float | None = None
+    heaviest: List[Tuple[str, float]] = []
+    for _ in range(max(1, runs)):
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+            capture_output=True,
+            text=True,
+            env=_env(),
+            cwd=PROJECT_DIR,
+        )
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return None, [], lines[-1] if lines else f"exit {proc.returncode}"
+
+        rows = []
+        total = None
+        for line in proc.stderr.splitlines():
+            m = _IMPORTTIME_RE.match(line)
+            if not m:
+                continue
+            cumulative_ms = int(m.group(2)) / 1000.0
+            name = m.group(4)
+            if name == module:
+                total = cumulative_ms
+            elif len(m.group(3)) > 1:
+                # Only the target's own subtree (indented) counts as heavy deps.
+                rows.append((name, cumulative_ms))
+        if total is not None and (best is None or total < best):
+            best = total
+            heaviest = sorted(rows, key=lambda r: -r[1])[:5]
+    return best, heaviest, ""
+
+
+def _project_scripts() -> Dict[str, str]:
+    text = (PROJECT_DIR / "pyproject.toml").read_text(encoding="utf-8")
+    try:
+        import tomllib
+    except ImportError:  # Python 3.10
+        scripts: Dict[str, str] = {}
+        section = re.search(r"^\[project\.scripts\]\s*$(.*?)(?=^\[|\Z)", text, re.M | re.S)
+        for m in re.finditer(r'^\s*([\w-]+)\s*=\s*"([^"]+)"', section.group(1) if section else "", re.M):
+            scripts[m.group(1)] = m.group(2)
+        return scripts
+    return dict(tomllib.loads(text).get("project", {}).get("scripts", {}))
+
+
+def _wall_clock(code: str, runs: int) -> Tuple[float | None, str]:
+    """Median wall-clock ms to run ``python -c code`` in a fresh process."""
+    samples = []
+    for _ in range(max(1, runs)):
+        t0 = time.perf_counter()
+        proc = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            text=True,
+            env=_env(),
+            cwd=PROJECT_DIR,
+        )
+        elapsed = (time.perf_counter() - t0) * 1000.0
+        if proc.returncode != 0:
+            lines = proc.stderr.strip().splitlines()
+            return None, lines[-1] if lines else f"exit {proc.returncode}"
+        samples.append(elapsed)
+    return statistics.median(samples), ""
+
+
+def deferred_imports(module: str, attr: str) -> List[str]:
+    """
+    Import statements inside the body of ``module.attr`` (absolute form),
+    i.e. what calling the entry point imports before doing anything else.
+    """
+    path = SRC_ROOT / Path(*module.split("."))
+    path = path / "__init__.py" if path.is_dir() else path.with_suffix(".py")
+    if not attr or not path.exists():
+        return []
+    tree = ast.parse(path.read_text(encoding="utf-8"))
+    func = next(
+        (n for n in tree.body if isinstance(n, ast.FunctionDef) and n.name == attr),
+        None,
+    )
+    if func is None:
+        return []
+
+    package = module.split(".")[:-1] if path.name != "__init__.py" else module.split(".")
+    statements = []
+    for node in ast.walk(func):
+        if isinstance(node, ast.Import):
+            statements.append(ast.unparse(node))
+        elif isinstance(node, ast.ImportFrom):
+            base = package[: len(package) - node.level + 1] if node.level else []
+            target = ".".join(base + ([node.module] if node.module else []))
+            names = ", ".join(a.name for a in node.names)
+            statements.append(f"from {target} import {names}")
+    return statements
+
+
+def measure_cold_starts(runs: int = 5) -> List[Tuple[str, float | None, float | None, str]]:
+    """
+    Cold start per entry point: ``(label, import ms, ready ms, error)``.
+    "import" is interpreter + module import + attribute lookup; "ready"
+    adds the entry function's own deferred imports (None if one fails,
+    with the error).
+    """
+    results = []
+    baseline, err = _wall_clock("pass", runs)
+    results.append(("python -c pass (baseline)", baseline, baseline, err))
+
+    for name, target in sorted(_project_scripts().items()):
+        module, _, attr = target.partition(":")
+        code = f"import {module} as m" + (f"; m.{attr}" if attr else "")
+        ms, err = _wall_clock(code, runs)
+        ready, ready_err = ms, err
+        deferred = deferred_imports(module, attr)
+        if ms is not None and deferred:
+            ready, ready_err = _wall_clock("; ".join([code] + deferred), runs)
+        results.append((f"{name} ({target})", ms, ready, err or ready_err))
+
+    # Bare-mode run of the app script: imports + first render of step 1.
+    app = PROJECT_DIR / "streamlit_app.py"
+    if app.exists():
+        ms, err = _wall_clock(f"import runpy; runpy.run_path({str(app)!r})", runs)
+        results.append(("streamlit_app.py", ms, ms, err))
+    return results
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Check import-time budgets and cold starts.")
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--no-cold-start", action="store_true")
+    args = parser.parse_args(argv)
+
+    over = failed = False
+    print("Import time (best of %d, cumulative):" % args.runs)
+    for module, budget in IMPORT_BUDGETS_MS.items():
+        ms, heaviest, err = measure_import(module, args.runs)
+        if ms is None:
+            print(f"  {module:<34} FAILED   {err}")
+            failed = True
+            continue
+        status = "ok" if ms <= budget else "OVER"
+        over = over or ms > budget
+        print(f"  {module:<34} {ms:7.1f} ms / {budget:5.0f} ms  {status}")
+        for name, dep_ms in heaviest:
+            print(f"      {name:<38} {dep_ms:7.1f} ms")
+
+    if not args.no_cold_start:
+        print("Cold start (median wall clock; import / ready to run):")
+        for label, ms, ready, err in measure_cold_starts(args.runs):
+            if ms is None:
+                print(f"  {label:<58} FAILED   {err}")
+                failed = True
+            elif ready is None:
+                print(f"  {label:<58} {ms:7.1f} ms / FAILED   {err}")
+                failed = True
+            else:
+                print(f"  {label:<58} {ms:7.1f} ms / {ready:7.1f} ms")
+
+    if over or failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,448 @@
+#!/usr/bin/env python
+"""
+Multi-user load test of the full wizard journey.
+
+    python -m doctor_patient.loadgen [--users 50] [--rate 0] [--sessions 200]
+        [--think exp:5] [--ttft-ms 300] [--token-ms 15] [--parallel 4]
+
+Each simulated patient takes a chief complaint sampled from the corpus
+(the CHIEF COMPLAINT lines of train_subjective.json) through the same calls
+as streamlit_app.py: run_symptom_flow -> run_drug_flow -> run_summary_flow
+on one OllamaSession, ticking the first options offered and pausing for a
+think time between clicks.
+
+Load model:
+  --users N   concurrent patients (worker threads)
+  --rate R    sessions arriving per second (Poisson); arrivals wait for a
+              free worker, and that wait is the queueing delay. 0 = closed
+              loop: every worker starts its next session as soon as its
+              last one finishes
+  --think D   think-time distribution: fixed:S, exp:MEAN, uniform:LO:HI or
+              lognormal:MEDIAN:SIGMA (seconds)
+
+LLM calls go to the stub server in tools/stub_ollama.py (tunable latency,
+slots and failure injection) unless --ollama-url points at a real Ollama.
+The report has per-step latency percentiles and served_by mix, session
+throughput and queueing delay, the stub's slot wait, and the same rates
+per --window seconds so saturation and fallbacks show up over time.
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import json
+import os
+import queue
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List
+
+from . import crew
+from .eval_retrieval import percentile
+from .tools import symptom_tier
+
+STEPS = ("symptom_options", "drugs", "summary")
+
+# Steps with an LLM path; "retrieval" there means the step fell back.
+LLM_STEPS = ("symptom_options", "summary")
+
+
+def parse_distribution(spec: str) -> Callable[[random.Random], float]:
+    """``"exp:5"`` -> sampler of seconds (see the module docstring)."""
+    kind, _, rest = spec.partition(":")
+    try:
+        args = [float(a) for a in rest.split(":")] if rest else []
+    except ValueError:
+        raise ValueError(f"Bad distribution {spec!r}") from None
+
+    if kind == "fixed" and len(args) == 1:
+        return lambda rng: args[0]
+    if kind == "exp" and len(args) == 1:
+        return lambda rng: rng.expovariate(1.0 / args[0]) if args[0] > 0 else 0.0
+    if kind == "uniform" and len(args) == 2:
+        return lambda rng: rng.uniform(args[0], args[1])
+    if kind == "lognormal" and len(args) == 2:
+        return lambda rng: args[0] * rng.lognormvariate(0.0, args[1])
+    raise ValueError(f"Bad distribution {spec!r}: use fixed:S, exp:MEAN, uniform:LO:HI or lognormal:MEDIAN:SIGMA")
+
+
+# ---------------------------------------------------------------------
+# One patient's journey
+# ---------------------------------------------------------------------
+
+def run_journey(
+    complaint: str,
+    rng: random.Random,
+    think: Callable[[random.Random], float],
+    picks: int = 2,
+) -> List[Dict[str, Any]]:
+    """
+    Steps 1 -> 4 of the wizard for one complaint. Returns one record per
+    step reached: ``{"step", "start", "ms", "served_by", "error"}`` with
+    ``start`` in ``time.time()`` seconds. An exception ends the journey.
+    """
+    session = crew.OllamaSession()
+    records: List[Dict[str, Any]] = []
+
+    def step(name: str, call: Callable[[], Any]) -> Any:
+        start = time.time()
+        t0 = time.perf_counter()
+        try:
+            result = call()
+            error = ""
+        except Exception as e:
+            result = None
+            error = f"{type(e).__name__}: {e}"
+        records.append(
+            {
+                "step": name,
+                "start": start,
+                "ms": (time.perf_counter() - t0) * 1000.0,
+                # run_drug_flow is retrieval-only and returns a plain list.
+                "served_by": getattr(result, "served_by", "retrieval") if not error else "",
+                "error": error,
+            }
+        )
+        return result
+
+    symptoms = step("symptom_options", lambda: crew.run_symptom_flow(complaint, session))
+    if symptoms is None:
+        return records
+    time.sleep(think(rng))
+
+    selected_symptoms = list(symptoms)[:picks]
+    drugs = step("drugs", lambda: crew.run_drug_flow(complaint, selected_symptoms))
+    if drugs is None:
+        return records
+    time.sleep(think(rng))
+
+    selected_drugs = list(drugs)[:picks]
+    step(
+        "summary",
+        lambda: crew.run_summary_flow(complaint, selected_symptoms, selected_drugs, session),
+    )
+    return records
+
+
+# ---------------------------------------------------------------------
+# Load driver
+# ---------------------------------------------------------------------
+
+def run_load(
+    complaints: List[str],
+    users: int = 10,
+    rate: float = 0.0,
+    sessions: int = 100,
+    duration: float = 0.0,
+    think: Callable[[random.Random], float] = parse_distribution("exp:2"),
+    seed: int = 0,
+) -> Dict[str, Any]:
+    """
+    Run ``sessions`` journeys (or as many as start within ``duration``
+    seconds, if set) on ``users`` workers. Returns ``{"started",
+    "finished", "sessions": [...], "steps": [...]}``; each session has its
+    arrival, start and end times and ``queue_ms``.
+    """
+    rng = random.Random(seed)
+    started_at = time.time()
+    stop_at = started_at + duration if duration > 0 else None
+
+    arrivals: "queue.Queue[Dict[str, Any] | None]" = queue.Queue()
+    lock = threading.Lock()
+    session_rows: List[Dict[str, Any]] = []
+    step_rows: List[Dict[str, Any]] = []
+    issued = [0]
+
+    def next_session() -> Dict[str, Any] | None:
+        with lock:
+            if issued[0] >= sessions or (stop_at is not None and time.time() >= stop_at):
+                return None
+            issued[0] += 1
+            return {"id": issued[0] - 1, "complaint": rng.choice(complaints), "seed": rng.random()}
+
+    def dispatcher() -> None:
+        # Open arrivals: Poisson process at ``rate``, queued for a free worker.
+        while True:
+            item = next_session()
+            if item is None:
+                break
+            item["arrival"] = time.time()
+            arrivals.put(item)
+            time.sleep(rng.expovariate(rate))
+        for _ in range(users):
+            arrivals.put(None)
+
+    def worker() -> None:
+        while True:
+            if rate > 0:
+                item = arrivals.get()
+            else:
+                item = next_session()
+                if item is not None:
+                    item["arrival"] = time.time()
+            if item is None:
+                return
+
+            start = time.time()
+            records = run_journey(item["complaint"], random.Random(item["seed"]), think)
+            end = time.time()
+            for r in records:
+                r["session"] = item["id"]
+            with lock:
+                step_rows.extend(records)
+                session_rows.append(
+                    {
+                        "id": item["id"],
+                        "complaint": item["complaint"],
+                        "arrival": item["arrival"],
+                        "start": start,
+                        "end": end,
+                        "queue_ms": (start - item["arrival"]) * 1000.0,
+                        "ok": len(records) == len(STEPS) and not any(r["error"] for r in records),
+                    }
+                )
+
+    threads = [threading.Thread(target=worker, daemon=True) for _ in range(users)]
+    if rate > 0:
+        threads.append(threading.Thread(target=dispatcher, daemon=True))
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    return {
+        "started": started_at,
+        "finished": time.time(),
+        "sessions": sorted(session_rows, key=lambda s: s["id"]),
+        "steps": sorted(step_rows, key=lambda r: r["start"]),
+    }
+
+
+# ---------------------------------------------------------------------
+# Report
+# ---------------------------------------------------------------------
+
+def _step_summary(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    ok = [r for r in rows if not r["error"]]
+    latencies = [r["ms"] for r in ok]
+    n = len(rows)
+    served = {kind: sum(1 for r in ok if r["served_by"] == kind) for kind in ("llm", "tier", "retrieval")}
+    return {
+        "n": n,
+        "p50_ms": percentile(latencies, 0.50),
+        "p90_ms": percentile(latencies, 0.90),
+        "p99_ms": percentile(latencies, 0.99),
+        "max_ms": max(latencies) if latencies else 0.0,
+        **{f"{kind}_rate": count / n if n else 0.0 for kind, count in served.items()},
+        "error_rate": (n - len(ok)) / n if n else 0.0,
+    }
+
+
+def summarize(
+    result: Dict[str, Any],
+    window: float = 10.0,
+    stub_queue: List[tuple] | None = None,
+) -> Dict[str, Any]:
+    """Overall and per-window metrics of a ``run_load`` result."""
+    t0 = result["started"]
+    elapsed = max(result["finished"] - t0, 1e-9)
+    sessions = result["sessions"]
+    steps = result["steps"]
+    queue_ms = [s["queue_ms"] for s in sessions]
+
+    report: Dict[str, Any] = {
+        "elapsed_s": elapsed,
+        "sessions": len(sessions),
+        "completed": sum(1 for s in sessions if s["ok"]),
+        "throughput_sessions_s": sum(1 for s in sessions if s["ok"]) / elapsed,
+        "throughput_steps_s": len(steps) / elapsed,
+        "queue_p50_ms": percentile(queue_ms, 0.50),
+        "queue_p99_ms": percentile(queue_ms, 0.99),
+        "queue_max_ms": max(queue_ms) if queue_ms else 0.0,
+        "steps": {name: _step_summary([r for r in steps if r["step"] == name]) for name in STEPS},
+    }
+    if stub_queue is not None:
+        waits = [w for _, w in stub_queue]
+        report["llm_queue_p50_ms"] = percentile(waits, 0.50)
+        report["llm_queue_p99_ms"] = percentile(waits, 0.99)
+
+    timeline = []
+    n_windows = max(1, int(elapsed // window) + (1 if elapsed % window else 0))
+    for w in range(n_windows):
+        lo, hi = t0 + w * window, t0 + (w + 1) * window
+        w_steps = [r for r in steps if lo <= r["start"] < hi]
+        w_sessions = [s for s in sessions if lo <= s["end"] < hi]
+        llm_steps = [r for r in w_steps if r["step"] in LLM_STEPS and not r["error"]]
+        row = {
+            "t_s": w * window,
+            "active": sum(1 for s in sessions if s["start"] < hi and s["end"] >= lo),
+            "completed": sum(1 for s in w_sessions if s["ok"]),
+            "throughput_sessions_s": sum(1 for s in w_sessions if s["ok"]) / window,
+            "queue_p99_ms": percentile(
+                [s["queue_ms"] for s in sessions if lo <= s["start"] < hi], 0.99
+            ),
+            "symptom_p99_ms": percentile(
+                [r["ms"] for r in w_steps if r["step"] == "symptom_options" and not r["error"]], 0.99
+            ),
+            "summary_p99_ms": percentile(
+                [r["ms"] for r in w_steps if r["step"] == "summary" and not r["error"]], 0.99
+            ),
+            "fallback_rate": (
+                sum(1 for r in llm_steps if r["served_by"] == "retrieval") / len(llm_steps)
+                if llm_steps else 0.0
+            ),
+            "error_rate": sum(1 for r in w_steps if r["error"]) / len(w_steps) if w_steps else 0.0,
+        }
+        if stub_queue is not None:
+            row["llm_queue_p99_ms"] = percentile([q for t, q in stub_queue if lo <= t < hi], 0.99)
+        timeline.append(row)
+    report["timeline"] = timeline
+    report["routing"] = crew.routing_stats()
+    report["symptom_tier"] = symptom_tier.tier_stats()
+    return report
+
+
+def format_report(report: Dict[str, Any]) -> str:
+    lines = [
+        f"[loadgen] {report['completed']}/{report['sessions']} sessions completed in "
+        f"{report['elapsed_s']:.1f}s: {report['throughput_sessions_s']:.2f} sessions/s, "
+        f"{report['throughput_steps_s']:.2f} steps/s",
+        f"[loadgen] Queueing delay (arrival -> free user): p50 {report['queue_p50_ms']:.0f} ms, "
+        f"p99 {report['queue_p99_ms']:.0f} ms, max {report['queue_max_ms']:.0f} ms",
+    ]
+    if "llm_queue_p50_ms" in report:
+        lines.append(
+            f"[loadgen] LLM slot wait (stub): p50 {report['llm_queue_p50_ms']:.0f} ms, "
+            f"p99 {report['llm_queue_p99_ms']:.0f} ms"
+        )
+
+    header = (
+        f"{'step':<16}{'n':>6}{'p50_ms':>10}{'p90_ms':>10}{'p99_ms':>10}{'max_ms':>10}"
+        f"{'llm':>7}{'tier':>7}{'retr':>7}{'error':>7}"
+    )
+    lines += ["", header, "-" * len(header)]
+    for name, s in report["steps"].items():
+        lines.append(
+            f"{name:<16}{s['n']:>6}{s['p50_ms']:>10.0f}{s['p90_ms']:>10.0f}{s['p99_ms']:>10.0f}"
+            f"{s['max_ms']:>10.0f}{s['llm_rate']:>7.0%}{s['tier_rate']:>7.0%}"
+            f"{s['retrieval_rate']:>7.0%}{s['error_rate']:>7.0%}"
+        )
+
+    has_llm_queue = any("llm_queue_p99_ms" in row for row in report["timeline"])
+    header = (
+        f"{'t_s':>6}{'active':>8}{'done':>6}{'sess/s':>8}{'queue_p99':>11}"
+        + (f"{'llm_q_p99':>11}" if has_llm_queue else "")
+        + f"{'sympt_p99':>11}{'summ_p99':>10}{'fallback':>10}{'error':>7}"
+    )
+    lines += ["", header, "-" * len(header)]
+    for row in report["timeline"]:
+        lines.append(
+            f"{row['t_s']:>6.0f}{row['active']:>8}{row['completed']:>6}"
+            f"{row['throughput_sessions_s']:>8.2f}{row['queue_p99_ms']:>11.0f}"
+            + (f"{row.get('llm_queue_p99_ms', 0.0):>11.0f}" if has_llm_queue else "")
+            + f"{row['symptom_p99_ms']:>11.0f}{row['summary_p99_ms']:>10.0f}"
+            f"{row['fallback_rate']:>10.0%}{row['error_rate']:>7.0%}"
+        )
+
+    flows = report["routing"]["flows"]
+    if flows:
+        lines.append("")
+        for flow, s in flows.items():
+            lines.append(
+                f"[loadgen] {flow}: {s['requests']:.0f} LLM requests, "
+                f"escalation {s['escalation_rate']:.0%}, fallback {s['fallback_rate']:.0%}"
+            )
+    return "\n".join(lines)
+
+
+@contextlib.contextmanager
+def _quiet(enabled: bool) -> Iterator[None]:
+    """Silence the flows' per-call prints (they would interleave across users)."""
+    if not enabled:
+        yield
+        return
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Load-test the wizard journey with many patients.")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--rate", type=float, default=0.0, help="Sessions/s (Poisson); 0 = closed loop.")
+    parser.add_argument("--sessions", type=int, default=100)
+    parser.add_argument("--duration", type=float, default=0.0, help="Stop starting sessions after S seconds.")
+    parser.add_argument("--think", default="exp:2", help="Think time between clicks (seconds).")
+    parser.add_argument("--window", type=float, default=10.0, help="Timeline bucket (seconds).")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--ollama-url", default=None,
+        help="Load a real Ollama (base URL, e.g. http://localhost:11434) instead of the stub.",
+    )
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=15.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--parallel", type=int, default=4, help="Stub generation slots.")
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--bad-json-rate", type=float, default=0.0)
+    parser.add_argument("--verbose", action="store_true", help="Keep the flows' per-call logging.")
+    parser.add_argument("--json", dest="json_out", default=None)
+    args = parser.parse_args(argv)
+
+    think = parse_distribution(args.think)
+    complaints = [text for _, text in symptom_tier.corpus_complaints()]
+    if not complaints:
+        raise SystemExit("No chief complaints in the corpus to replay.")
+
+    server = stub = None
+    if args.ollama_url:
+        base_url = args.ollama_url.rstrip("/")
+        crew.OLLAMA_URL = base_url if base_url.endswith("/api/chat") else base_url + "/api/chat"
+    else:
+        from .tools import stub_ollama
+
+        server, stub, base_url = stub_ollama.start_stub(
+            stub_ollama.StubState(
+                args.ttft_ms, args.token_ms, args.jitter, args.parallel,
+                args.error_rate, args.bad_json_rate, seed=args.seed,
+            )
+        )
+        crew.OLLAMA_URL = base_url + "/api/chat"
+    print(f"[loadgen] LLM at {crew.OLLAMA_URL}")
+
+    # One untimed journey loads the corpus, indexes, routes and tier, so
+    # workers don't race to build them and the first window isn't skewed.
+    with _quiet(not args.verbose):
+        run_journey(complaints[0], random.Random(args.seed), lambda rng: 0.0)
+    crew._MODEL_STATS.clear()
+    crew._FLOW_STATS.clear()
+    symptom_tier._STATS.update(lookups=0, hits=0, hit_ms=0.0, miss_ms=0.0, saved_ms=0.0)
+    if stub is not None:
+        stub.reset()
+
+    print(
+        f"[loadgen] {args.users} users, "
+        + (f"{args.rate:g} sessions/s arrivals" if args.rate > 0 else "closed loop")
+        + f", think {args.think}, up to {args.sessions} sessions"
+        + (f" / {args.duration:g}s" if args.duration > 0 else "")
+    )
+    try:
+        with _quiet(not args.verbose):
+            result = run_load(
+                complaints, args.users, args.rate, args.sessions, args.duration, think, args.seed
+            )
+    finally:
+        if server is not None:
+            server.shutdown()
+
+    report = summarize(result, args.window, stub.queue_samples if stub is not None else None)
+    if stub is not None:
+        report["stub"] = stub.snapshot()
+    print(format_report(report))
+    if args.json_out:
+        with open(args.json_out, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
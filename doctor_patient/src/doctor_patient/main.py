@@ -4,8 +4,6 @@ import warnings
 
 from datetime import datetime
 
-from doctor_patient.crew import DoctorPatient
-
 warnings.filterwarnings("ignore", category=SyntaxWarning, module="pysbd")
 
 # This main file is intended to be a way for you to run your
@@ -17,6 +15,8 @@ def run():
     """
     Run the crew.
     """
+    from doctor_patient.crew import DoctorPatient  # deferred: pulls in crewai
+
     inputs = {
         'topic': 'AI LLMs',
         'current_year': str(datetime.now().year)
@@ -32,6 +32,8 @@ def train():
     """
     Train the crew for a given number of iterations.
     """
+    from doctor_patient.crew import DoctorPatient  # deferred: pulls in crewai
+
     inputs = {
         "topic": "AI LLMs",
         'current_year': str(datetime.now().year)
@@ -46,6 +48,8 @@ def replay():
     """
     Replay the crew execution from a specific task.
     """
+    from doctor_patient.crew import DoctorPatient  # deferred: pulls in crewai
+
     try:
         DoctorPatient().crew().replay(task_id=sys.argv[1])
 
@@ -56,6 +60,8 @@ def test():
     """
     Test the crew execution and returns the results.
     """
+    from doctor_patient.crew import DoctorPatient  # deferred: pulls in crewai
+
     inputs = {
         "topic": "AI LLMs",
         "current_year": str(datetime.now().year)
@@ -73,6 +79,8 @@ def run_with_trigger():
     """
     import json
 
+    from doctor_patient.crew import DoctorPatient  # deferred: pulls in crewai
+
     if len(sys.argv) < 2:
         raise Exception("No trigger payload provided. Please provide JSON payload as argument.")
 
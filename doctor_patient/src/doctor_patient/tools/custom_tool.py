@@ -8,9 +8,8 @@ from crewai.tools import BaseTool
 
 from . import retrieval
 
-
-# Make sure the JSON is loaded once at startup (idempotent).
-retrieval.build_stores()
+# The corpus and index load on the first tool call (retrieval caches them);
+# call retrieval.build_stores() explicitly to warm them up front.
 
 
 # ------------- Tool 1: get_candidate_symptoms ------------- #
@@ -0,0 +1,174 @@
+# src/doctor_patient/tools/med_lexicon.py
+"""
+Medication lexicon compiled into a single Aho-Corasick automaton.
+
+The lexicon maps every surface form (generic or brand, lower-cased) to a
+canonical generic name. It is assembled from a local name list
+(``data/medication_names.tsv``) plus names mined from clinical notes
+("<name> <dose> mg"), then compiled once; a text is scanned in one pass
+regardless of how many names the lexicon holds.
+"""
+from __future__ import annotations
+
+import re
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Tuple
+
+TOOLS_DIR = Path(__file__).resolve().parent
+DATA_DIR = TOOLS_DIR.parent.parent / "data"
+
+NAMES_PATH = DATA_DIR / "medication_names.tsv"
+
+# "<name> <dose> mg|mcg|unit(s)" in notes; the name group is mined.
+_DOSE_RE = re.compile(
+    r"\b([A-Za-z][A-Za-z-]{2,})\s+\d+(?:\.\d+)?\s*(?:mg|mcg|units?)\b",
+    re.IGNORECASE,
+)
+
+# Words that precede a dose in notes but are not drug names.
+MINE_STOPWORDS = {
+    "mg", "daily", "every", "refill", "dose", "doses", "dosage",
+    "we", "he", "she", "they", "you", "her", "his", "their",
+    "continue", "start", "started", "initiate", "repeat", "order",
+    "increase", "increased", "decrease", "decreased", "reduce", "take",
+    "taking", "takes", "prescribe", "prescribed", "prescription",
+    "the", "and", "with", "from", "for", "about", "around", "approximately",
+    "then", "than", "plus", "also", "only", "twice", "once", "total",
+    "tablet", "tablets", "capsule", "capsules", "pill", "pills",
+    "cypionate", "hydrochloride", "sodium", "succinate", "tartrate", "er", "xr",
+}
+
+_WS_RE = re.compile(r"\s+")
+
+
+def normalize_name(name: str) -> str:
+    return _WS_RE.sub(" ", (name or "").strip().lower())
+
+
+def load_names(path: Path = NAMES_PATH) -> Dict[str, str]:
+    """Read ``name[<TAB>generic]`` lines into ``{surface form: generic}``."""
+    lexicon: Dict[str, str] = {}
+    if not path.exists():
+        return lexicon
+    with path.open("r", encoding="utf-8") as f:
+        for line in f:
+            line = line.rstrip("\n")
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            parts = line.split("\t")
+            name = normalize_name(parts[0])
+            generic = normalize_name(parts[1]) if len(parts) > 1 and parts[1].strip() else name
+            if name:
+                lexicon[name] = generic
+    return lexicon
+
+
+def mine_names(notes: Iterable[str]) -> Dict[str, str]:
+    """Names written with a dose in ``notes``, each canonical to itself."""
+    mined: Dict[str, str] = {}
+    for text in notes:
+        if not text:
+            continue
+        for m in _DOSE_RE.finditer(text):
+            name = normalize_name(m.group(1).strip("-"))
+            if len(name) > 3 and name not in MINE_STOPWORDS:
+                mined.setdefault(name, name)
+    return mined
+
+
+def build_lexicon(notes: Iterable[str] = (), path: Path = NAMES_PATH) -> Dict[str, str]:
+    """Local name list, extended with names mined from ``notes``."""
+    lexicon = load_names(path)
+    for name, generic in mine_names(notes).items():
+        lexicon.setdefault(name, generic)
+    return {name: lexicon[name] for name in sorted(lexicon)}
+
+
+class AhoCorasick:
+    """
+    Multi-pattern matcher. ``add`` patterns, ``build`` once, then
+    ``find_all`` scans a text in a single pass over its characters.
+    """
+
+    def __init__(self) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        # Per state: (pattern length, value) for every pattern ending here.
+        self._out: List[List[Tuple[int, str]]] = [[]]
+        self._built = False
+
+    def add(self, pattern: str, value: str) -> None:
+        if self._built:
+            raise RuntimeError("Cannot add patterns after build()")
+        state = 0
+        for ch in pattern:
+            nxt = self._goto[state].get(ch)
+            if nxt is None:
+                nxt = len(self._goto)
+                self._goto[state][ch] = nxt
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            state = nxt
+        self._out[state].append((len(pattern), value))
+
+    def build(self) -> "AhoCorasick":
+        queue: List[int] = list(self._goto[0].values())
+        head = 0
+        while head < len(queue):
+            state = queue[head]
+            head += 1
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                f = self._fail[state]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                target = self._goto[f].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+        self._built = True
+        return self
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, int, str]]:
+        """Yield ``(start, end, value)`` for every (possibly overlapping) match."""
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for i, ch in enumerate(text):
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            for length, value in out[state]:
+                yield i + 1 - length, i + 1, value
+
+    def find_all(self, text: str) -> List[Tuple[int, int, str]]:
+        """Leftmost-longest, non-overlapping, whole-word matches."""
+        n = len(text)
+        candidates = [
+            (start, end, value)
+            for start, end, value in self.iter_matches(text)
+            if (start == 0 or not text[start - 1].isalnum())
+            and (end == n or not text[end].isalnum())
+        ]
+        candidates.sort(key=lambda x: (x[0], x[0] - x[1]))
+
+        picked: List[Tuple[int, int, str]] = []
+        last_end = 0
+        for start, end, value in candidates:
+            if start >= last_end:
+                picked.append((start, end, value))
+                last_end = end
+        return picked
+
+
+def compile_lexicon(lexicon: Dict[str, str]) -> AhoCorasick:
+    matcher = AhoCorasick()
+    for name, generic in lexicon.items():
+        matcher.add(name, generic)
+    return matcher.build()
+
+
+def extract(matcher: AhoCorasick, text: str) -> List[str]:
+    """Canonical medication names mentioned in ``text``, sorted."""
+    if not text:
+        return []
+    return sorted({value for _, _, value in matcher.find_all(text.lower())})
@@ -1,10 +1,29 @@
 from __future__ import annotations
 
+import hashlib
+import heapq
 import json
 import math
+import os
 import re
+import threading
+import time
+from bisect import bisect_left
+from collections import OrderedDict, deque
+from collections.abc import Sequence
+from itertools import accumulate, islice
 from pathlib import Path
-from typing import Any, Dict, List, Tuple
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Set, Tuple
+
+from . import med_lexicon
+
+if TYPE_CHECKING:
+    from concurrent.futures import ThreadPoolExecutor
+
+# concurrent.futures.process / urllib.request (multiprocessing, http.client,
+# ssl, email) cost more to import than the rest of this module; they are
+# imported where used, since most processes never build in parallel or
+# talk to shards.
 
 # ---------------------------------------------------------------------
 # Paths (adapted to your repo layout)
@@ -18,26 +37,146 @@ DATA_DIR = SRC_ROOT / "data"                         # .../src/data
 SUBJ_PATH = DATA_DIR / "train_subjective.json"
 
 # ---------------------------------------------------------------------
-# In-memory cache (ONLY subjective cases)
+# Subjective case store (ids + file spans; cases read back on demand)
 # ---------------------------------------------------------------------
 
-_SUBJ_CASES: List[Dict[str, Any]] | None = None
+_SUBJ_CASES: "_CaseStore | None" = None
+
+# Bytes of the data file decoded per read while streaming.
+_READ_CHUNK = 1 << 16
 
+_JSON_WS = " \t\n\r"
+_DECODER = json.JSONDecoder()
 
-def _load_json(path: Path) -> Any:
+
+def _iter_json_items(path: Path, offsets: bool = False) -> Iterator[Any]:
+    """
+    Stream the items of a ``{"data": [...]}`` (or bare ``[...]``) document
+    one element at a time.
+
+    Only the element being decoded is held in memory, so a large corpus can
+    be normalized / indexed while it is still being read. With ``offsets``
+    each item comes as ``(item, start_byte, end_byte)``: its span in the
+    file, for reading it back later with ``_read_json_span``.
+    """
     if not path.exists():
         raise FileNotFoundError(f"Data file not found: {path}")
-    with path.open("r", encoding="utf-8") as f:
-        return json.load(f)
-
 
-def _normalize_subjective_cases(raw: Any) -> List[Dict[str, Any]]:
+    # newline="": no newline translation, so characters map 1:1 onto the
+    # file's UTF-8 bytes.
+    with path.open("r", encoding="utf-8", newline="") as f:
+        buf = ""
+        pos = 0
+        eof = False
+        # Byte offset of buf[mark]; advanced incrementally so every
+        # character is encoded at most once.
+        mark = 0
+        mark_byte = 0
+        span = (0, 0)
+
+        def byte_at(i: int) -> int:
+            nonlocal mark, mark_byte
+            mark_byte += len(buf[mark:i].encode("utf-8"))
+            mark = i
+            return mark_byte
+
+        def fill() -> bool:
+            nonlocal buf, pos, eof, mark
+            if eof:
+                return False
+            chunk = f.read(_READ_CHUNK)
+            if not chunk:
+                eof = True
+                return False
+            if offsets:
+                byte_at(pos)
+                mark = 0
+            buf = buf[pos:] + chunk
+            pos = 0
+            return True
+
+        def peek() -> str:
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in _JSON_WS:
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if not fill():
+                    return ""
+
+        def expect(ch: str) -> None:
+            nonlocal pos
+            if peek() != ch:
+                raise json.JSONDecodeError(f"Expecting {ch!r}", buf, pos)
+            pos += 1
+
+        def decode() -> Any:
+            nonlocal pos, span
+            peek()
+            while True:
+                try:
+                    value, end = _DECODER.raw_decode(buf, pos)
+                except json.JSONDecodeError:
+                    if fill():
+                        continue
+                    raise
+                # A scalar ending exactly at the buffer edge may be truncated.
+                if end == len(buf) and fill():
+                    continue
+                if offsets:
+                    span = (byte_at(pos), byte_at(end))
+                pos = end
+                return value
+
+        def iter_array() -> Iterator[Any]:
+            nonlocal pos
+            expect("[")
+            if peek() == "]":
+                pos += 1
+                return
+            while True:
+                value = decode()
+                yield (value, *span) if offsets else value
+                ch = peek()
+                pos += 1
+                if ch == "]":
+                    return
+                if ch != ",":
+                    raise json.JSONDecodeError("Expecting ',' or ']'", buf, pos - 1)
+
+        first = peek()
+        if first == "[":
+            yield from iter_array()
+            return
+        if first != "{":
+            return
+
+        pos += 1
+        if peek() == "}":
+            return
+        while True:
+            key = decode()
+            expect(":")
+            if key == "data" and peek() == "[":
+                yield from iter_array()
+            else:
+                decode()
+            ch = peek()
+            pos += 1
+            if ch == "}":
+                return
+            if ch != ",":
+                raise json.JSONDecodeError("Expecting ',' or '}'", buf, pos - 1)
+
+
+def _normalize_item(idx: int, item: Any) -> Dict[str, Any] | None:
     """
     train_subjective.json format:
 
     { "data": [ { "src": "...", "subjective": "..." }, ... ] }
 
-    We convert each item into:
+    Item ``idx`` becomes (None when it has no dialogue):
 
     {
       "id": int,
@@ -45,58 +184,130 @@ def _normalize_subjective_cases(raw: Any) -> List[Dict[str, Any]]:
       "raw": dict
     }
     """
-    if isinstance(raw, dict) and "data" in raw:
-        items = raw["data"]
-    elif isinstance(raw, list):
-        items = raw
-    else:
-        items = []
+    if not isinstance(item, dict):
+        return None
+    dialogue = (item.get("src") or item.get("subjective") or "").strip()
+    if not dialogue:
+        return None
+    return {
+        "id": idx,
+        "dialogue": dialogue,
+        "raw": item,
+    }
 
-    norm: List[Dict[str, Any]] = []
+
+def _normalize_subjective_cases(items: Iterable[Any]) -> Iterator[Dict[str, Any]]:
+    """Cases (see ``_normalize_item``) from items streamed by ``_iter_json_items``."""
     for idx, item in enumerate(items):
-        dialogue = (item.get("src") or item.get("subjective") or "").strip()
-        if not dialogue:
-            continue
+        case = _normalize_item(idx, item)
+        if case is not None:
+            yield case
 
-        norm.append(
-            {
-                "id": idx,
-                "dialogue": dialogue,
-                "raw": item,
-            }
-        )
 
-    return norm
+def _read_json_span(path: Path, start: int, end: int) -> Any:
+    with path.open("rb") as f:
+        f.seek(start)
+        return json.loads(f.read(end - start))
+
+
+# Decoded cases kept by _CaseStore; enough for a few queries' hits.
+CASE_CACHE_SIZE = 64
+
+
+class _CaseStore(Sequence):
+    """
+    The corpus cases by position, without holding them in memory.
+
+    Only each case's id and byte span in the data file are kept;
+    ``store[pos]`` reads that one item back (the CASE_CACHE_SIZE most
+    recent are cached) and iterating streams the file again.
+    """
 
+    def __init__(self, path: Path, spans: List[Tuple[int, int, int]]) -> None:
+        self.path = path
+        self.spans = spans  # (case id, start byte, end byte)
+        self._cache: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()  # sessions / loadgen threads share it
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def __getitem__(self, pos):  # type: ignore[override]
+        if isinstance(pos, slice):
+            return [self[i] for i in range(*pos.indices(len(self)))]
+        with self._lock:
+            case = self._cache.get(pos)
+            if case is not None:
+                self._cache.move_to_end(pos)
+                return case
+        case_id, start, end = self.spans[pos]
+        case = _normalize_item(case_id, _read_json_span(self.path, start, end))
+        with self._lock:
+            self._cache[pos] = case
+            self._cache.move_to_end(pos)
+            while len(self._cache) > CASE_CACHE_SIZE:
+                self._cache.popitem(last=False)
+        return case
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return _normalize_subjective_cases(_iter_json_items(self.path))
+
+
+def iter_subjective_cases() -> Iterator[Dict[str, Any]]:
+    """
+    Yield subjective cases, streaming them from disk.
 
-def _load_subjective_cases() -> List[Dict[str, Any]]:
+    The first full pass records where each case lives in the file, so
+    ``_load_subjective_cases()`` can hand out single cases by position
+    afterwards; no pass keeps more than one case in memory.
+    """
     global _SUBJ_CASES
     if _SUBJ_CASES is not None:
-        return _SUBJ_CASES
+        yield from _SUBJ_CASES
+        return
+
+    spans: List[Tuple[int, int, int]] = []
+    for idx, (item, start, end) in enumerate(_iter_json_items(SUBJ_PATH, offsets=True)):
+        case = _normalize_item(idx, item)
+        if case is None:
+            continue
+        spans.append((idx, start, end))
+        yield case
 
-    raw = _load_json(SUBJ_PATH)
-    _SUBJ_CASES = _normalize_subjective_cases(raw)
-    print(f"[retrieval] Loaded {len(_SUBJ_CASES)} subjective cases from {SUBJ_PATH}")
-    return _SUBJ_CASES
+    _SUBJ_CASES = _CaseStore(SUBJ_PATH, spans)
+    print(f"[retrieval] Loaded {len(spans)} subjective cases from {SUBJ_PATH}")
+
+
+def _load_subjective_cases() -> "_CaseStore | List[Dict[str, Any]]":
+    if _SUBJ_CASES is None:
+        for _ in iter_subjective_cases():
+            pass
+    return _SUBJ_CASES if _SUBJ_CASES is not None else []
 
 
 def build_stores() -> None:
-    """Load only the subjective dataset."""
-    _load_subjective_cases()
+    """Load the subjective dataset, its retrieval index(es) and co-occurrence table."""
+    if not SHARD_URLS:
+        # A shard coordinator only needs the (persisted) co-occurrence table.
+        _load_subjective_cases()
+        _load_index()
+        if RETRIEVAL_UNIT == "turn":
+            _load_turn_index()
+    _load_cooccurrence()
 
 
 # ---------------------------------------------------------------------
 # Basic text similarity helpers
 # ---------------------------------------------------------------------
 
+# Characters dropped from tokens. Whitespace is kept so that a single
+# substitution over the whole text followed by split() yields exactly the
+# per-token cleanup the retrieval helpers were written against.
+_TOKEN_STRIP_RE = re.compile(r"[^\w\-\s]")
+
+
 def _tokenize(text: str) -> List[str]:
-    text = (text or "").lower().replace("\n", " ")
-    out = []
-    for t in text.split():
-        t = re.sub(r"[^\w\-]", "", t)
-        if t:
-            out.append(t)
-    return out
+    return _TOKEN_STRIP_RE.sub("", (text or "").lower()).split()
 
 
 def _jaccard_similarity(a: List[str], b: List[str]) -> float:
@@ -114,6 +325,11 @@ def _jaccard_similarity(a: List[str], b: List[str]) -> float:
 # Minimal symptom/medication extractors (from subjective text)
 # ---------------------------------------------------------------------
 
+# Some notes head the complaint "CC:" instead; only as a heading (line
+# start, colon), since "cc" also appears in doses.
+_CC_HEADING_RE = re.compile(r"^[ \t]*CC[ \t]*:", re.M)
+
+
 def _extract_chief_complaint_text(text: str) -> str:
     if not text:
         return ""
@@ -121,9 +337,13 @@ def _extract_chief_complaint_text(text: str) -> str:
     marker = "CHIEF COMPLAINT"
     up = text.upper()
     idx = up.find(marker)
-    if idx == -1:
-        return ""
-    after = text[idx + len(marker):]
+    if idx != -1:
+        after = text[idx + len(marker):]
+    else:
+        m = _CC_HEADING_RE.search(text)
+        if m is None:
+            return ""
+        after = text[m.end():]
     for line in after.splitlines():
         line = line.strip(" \t\r\n.:")
         if line:
@@ -144,29 +364,1393 @@ def _extract_symptom_phrases(text: str) -> List[str]:
     return out
 
 
-_MED_STOPWORDS = {
-    "mg", "daily", "Every", "Refill",
-    "We", "I", "He", "She", "They",
-    "Continue", "Start", "Initiate",
-    "Repeat", "Order",
-}
+# Medication names come from a compiled lexicon (see tools/med_lexicon.py):
+# the local name list plus names mined from the corpus notes, normalized to
+# generics and matched in a single Aho-Corasick pass.
+
+MEDLEX_VERSION = 1
+MEDLEX_PATH = DATA_DIR / "train_subjective.medlex.json"
 
+_MED_LEXICON: Dict[str, str] | None = None
+_MED_MATCHER: med_lexicon.AhoCorasick | None = None
+
+
+def _set_med_lexicon(lexicon: Dict[str, str]) -> None:
+    """Install (and compile) the lexicon; also the index worker initializer."""
+    global _MED_LEXICON, _MED_MATCHER
+    _MED_LEXICON = lexicon
+    _MED_MATCHER = med_lexicon.compile_lexicon(lexicon)
+
+
+def load_med_lexicon(
+    path: Path = MEDLEX_PATH,
+    data_path: Path | None = None,
+) -> Dict[str, str] | None:
+    """
+    Load a persisted lexicon if it matches the corpus (``data_path``,
+    default SUBJ_PATH), else None. A shard coordinator has no corpus to
+    check against, so there only the name list it was built from has to
+    match.
+    """
+    coordinator = SHARD_URLS and data_path is None
+    if not path.exists() or not (coordinator or (data_path or SUBJ_PATH).exists()):
+        return None
+    with path.open("r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") != MEDLEX_VERSION:
+        return None
+    source = data.get("source") or {}
+    expected = _corpus_fingerprint(data_path)
+    if coordinator:
+        if source.get("lexicon") != expected.get("lexicon"):
+            return None
+    elif source != expected:
+        return None
+    return data.get("names") or {}
+
+
+def _load_med_lexicon() -> Dict[str, str]:
+    if _MED_LEXICON is not None:
+        return _MED_LEXICON
+
+    lexicon = load_med_lexicon()
+    if lexicon is None and SHARD_URLS:
+        # The coordinator never reads the corpus: local name list only.
+        lexicon = med_lexicon.load_names()
+        print(f"[retrieval] No persisted medication lexicon; using {len(lexicon)} listed names")
+    elif lexicon is None:
+        lexicon = med_lexicon.build_lexicon(
+            (c["raw"].get("tgt") or "") for c in iter_subjective_cases()
+        )
+    _set_med_lexicon(lexicon)
+    return lexicon
 
-def _extract_medications(text: str) -> List[str]:
+
+def extract_medications(text: str) -> List[str]:
+    """Canonical (generic) medication names mentioned anywhere in ``text``."""
     if not text:
         return []
-    meds = set()
-    pattern = re.compile(r"([A-Za-z][A-Za-z0-9_-]*)\s+\d+\s*mg", re.IGNORECASE)
+    if _MED_MATCHER is None:
+        _load_med_lexicon()
+    return med_lexicon.extract(_MED_MATCHER, text)
 
-    for line in text.splitlines():
-        if "mg" not in line:
+
+# ---------------------------------------------------------------------
+# Inverted index over subjective dialogues
+# ---------------------------------------------------------------------
+#
+# Index layout (plain JSON-serialisable dict, doc positions follow the
+# order of iter_subjective_cases()):
+#
+# {
+#   "version": int,
+#   "source": {"size": int, "sha256": str},
+#   "doc_ids": [case id, ...],
+#   "doc_len": [token count, ...],
+#   "doc_uniq": [distinct token count, ...],
+#   "chief_complaint": [str, ...],
+#   "symptoms": [[str, ...], ...],
+#   "medications": [[str, ...], ...],
+#   "postings": {term: [[doc_pos, tf], ...], ...},  # doc_pos ascending
+#   "bounds": {term: [max tf, min doc_len, min doc_uniq], ...}
+# }
+#
+# "bounds" are per-term maxima/minima over the term's postings; they give
+# the score upper bounds used by top-k pruning (see _prune_top_k).
+
+INDEX_VERSION = 3
+INDEX_PATH = DATA_DIR / "train_subjective.index.json"
+
+# Documents handed to one worker task.
+INDEX_CHUNK_SIZE = 256
+
+# Print build progress every N indexed documents.
+INDEX_PROGRESS_EVERY = 10_000
+
+_INDEX: Dict[str, Any] | None = None
+
+
+def _index_chunk(chunk: List[Tuple[int, int, str]]) -> Dict[str, Any]:
+    """
+    Tokenize and extract one chunk of ``(doc_pos, case_id, dialogue)``.
+
+    Runs inside worker processes, so it only touches module-level pure
+    helpers and returns plain data.
+    """
+    out: Dict[str, Any] = {
+        "doc_ids": [],
+        "doc_len": [],
+        "doc_uniq": [],
+        "chief_complaint": [],
+        "symptoms": [],
+        "medications": [],
+        "postings": {},
+        "tokens": 0,
+    }
+    postings: Dict[str, List[List[int]]] = out["postings"]
+
+    for pos, case_id, text in chunk:
+        tokens = _tokenize(text)
+        tf: Dict[str, int] = {}
+        for t in tokens:
+            tf[t] = tf.get(t, 0) + 1
+        for t, n in tf.items():
+            postings.setdefault(t, []).append([pos, n])
+
+        out["doc_ids"].append(case_id)
+        out["doc_len"].append(len(tokens))
+        out["doc_uniq"].append(len(tf))
+        out["chief_complaint"].append(_extract_chief_complaint_text(text))
+        out["symptoms"].append(_extract_symptom_phrases(text))
+        out["medications"].append(extract_medications(text))
+        out["tokens"] += len(tokens)
+
+    return out
+
+
+def _iter_index_chunks(
+    cases: Iterable[Dict[str, Any]],
+    chunk_size: int,
+) -> Iterator[List[Tuple[int, int, str]]]:
+    chunk: List[Tuple[int, int, str]] = []
+    for pos, c in enumerate(cases):
+        chunk.append((pos, c["id"], c["dialogue"]))
+        if len(chunk) >= chunk_size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def _iter_chunk_results(
+    chunks: Iterator[List[Tuple[int, int, str]]],
+    workers: int,
+    lexicon: Dict[str, str],
+) -> Iterator[Dict[str, Any]]:
+    """Yield ``_index_chunk`` results in input order, optionally in parallel."""
+    if workers <= 1:
+        for chunk in chunks:
+            yield _index_chunk(chunk)
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    # Keep a bounded number of chunks in flight so memory stays flat while
+    # the corpus is still streaming in.
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        initializer=_set_med_lexicon,
+        initargs=(lexicon,),
+    ) as pool:
+        pending: deque = deque()
+        for chunk in chunks:
+            pending.append(pool.submit(_index_chunk, chunk))
+            if len(pending) >= 2 * workers:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+
+
+def _default_index_workers() -> int:
+    try:
+        return max(1, int(os.environ.get("DOCTOR_PATIENT_INDEX_WORKERS", "1")))
+    except ValueError:
+        return 1
+
+
+def _source_fingerprint(path: Path) -> Dict[str, Any]:
+    h = hashlib.sha256()
+    with path.open("rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            h.update(block)
+    return {"size": path.stat().st_size, "sha256": h.hexdigest()}
+
+
+def _corpus_fingerprint(path: Path | None = None) -> Dict[str, Any]:
+    """Identity of everything derived data depends on: corpus + name list."""
+    path = path or SUBJ_PATH
+    fp = _source_fingerprint(path) if path.exists() else {}
+    if med_lexicon.NAMES_PATH.exists():
+        fp["lexicon"] = _source_fingerprint(med_lexicon.NAMES_PATH)["sha256"]
+    return fp
+
+
+def build_index(
+    cases: Iterable[Dict[str, Any]] | None = None,
+    workers: int | None = None,
+    chunk_size: int = INDEX_CHUNK_SIZE,
+    lexicon: Dict[str, str] | None = None,
+) -> Dict[str, Any]:
+    """
+    Build the inverted index, sharding tokenization/extraction across a
+    process pool when ``workers > 1``.
+
+    Chunks are merged strictly in corpus order, so the result (and its
+    ``save_index`` serialisation) does not depend on the worker count.
+    ``lexicon`` overrides the medication lexicon (default: the corpus one).
+    """
+    if lexicon is None:
+        lexicon = _load_med_lexicon()
+    else:
+        _set_med_lexicon(lexicon)
+    if cases is None:
+        cases = iter_subjective_cases()
+    if workers is None:
+        workers = _default_index_workers()
+
+    index: Dict[str, Any] = {
+        "version": INDEX_VERSION,
+        "source": _corpus_fingerprint(),
+        "doc_ids": [],
+        "doc_len": [],
+        "doc_uniq": [],
+        "chief_complaint": [],
+        "symptoms": [],
+        "medications": [],
+    }
+    postings: Dict[str, List[List[int]]] = {}
+
+    started = time.perf_counter()
+    n_tokens = 0
+    next_report = INDEX_PROGRESS_EVERY
+
+    for part in _iter_chunk_results(_iter_index_chunks(cases, chunk_size), workers, lexicon):
+        for key in ("doc_ids", "doc_len", "doc_uniq", "chief_complaint", "symptoms", "medications"):
+            index[key].extend(part[key])
+        for term, plist in part["postings"].items():
+            postings.setdefault(term, []).extend(plist)
+        n_tokens += part["tokens"]
+
+        n_docs = len(index["doc_ids"])
+        if n_docs >= next_report:
+            elapsed = max(time.perf_counter() - started, 1e-9)
+            print(
+                f"[retrieval] Indexed {n_docs} docs "
+                f"({n_docs / elapsed:.0f} docs/s, {n_tokens / elapsed:.0f} tokens/s)"
+            )
+            next_report += INDEX_PROGRESS_EVERY
+
+    index["postings"] = {t: postings[t] for t in sorted(postings)}
+    index["bounds"] = _term_bounds(index)
+
+    elapsed = max(time.perf_counter() - started, 1e-9)
+    n_docs = len(index["doc_ids"])
+    print(
+        f"[retrieval] Built index: {n_docs} docs, {len(postings)} terms, "
+        f"{n_tokens} tokens in {elapsed:.2f}s with {workers} worker(s) "
+        f"({n_docs / elapsed:.0f} docs/s, {n_tokens / elapsed:.0f} tokens/s)"
+    )
+    return index
+
+
+def _term_bounds(index: Dict[str, Any]) -> Dict[str, List[int]]:
+    doc_len = index["doc_len"]
+    doc_uniq = index["doc_uniq"]
+    bounds: Dict[str, List[int]] = {}
+    for t, plist in index["postings"].items():
+        bounds[t] = [
+            max(tf for _, tf in plist),
+            min(doc_len[pos] for pos, _ in plist),
+            min(doc_uniq[pos] for pos, _ in plist),
+        ]
+    return bounds
+
+
+def save_index(index: Dict[str, Any], path: Path = INDEX_PATH) -> None:
+    """Write the index (or any derived table) as canonical JSON (stable bytes for identical input)."""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, sort_keys=True, separators=(",", ":"))
+    tmp.replace(path)
+
+
+def load_index(path: Path = INDEX_PATH) -> Dict[str, Any] | None:
+    """Load a persisted index if it matches the current corpus, else None."""
+    if not path.exists() or not SUBJ_PATH.exists():
+        return None
+    with path.open("r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != INDEX_VERSION:
+        return None
+    if index.get("source") != _corpus_fingerprint():
+        return None
+    return index
+
+
+def _load_index() -> Dict[str, Any]:
+    global _INDEX
+    if _INDEX is not None:
+        return _INDEX
+
+    index = load_index()
+    if index is None:
+        # Straight from the stream: no case is kept once it is indexed.
+        index = build_index()
+    else:
+        print(f"[retrieval] Loaded index for {len(index['doc_ids'])} docs from {INDEX_PATH}")
+    _INDEX = index
+    return _INDEX
+
+
+# ---------------------------------------------------------------------
+# Scoring over an index (Jaccard, BM25)
+# ---------------------------------------------------------------------
+
+# "jaccard" keeps the original behaviour; "bm25" uses corpus statistics.
+SCORER = os.environ.get("DOCTOR_PATIENT_SCORER", "jaccard")
+
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def index_stats(index: Dict[str, Any], terms: Iterable[str]) -> Dict[str, Any]:
+    """Collection statistics needed to score ``terms`` with BM25."""
+    postings = index["postings"]
+    return {
+        "n_docs": len(index["doc_ids"]),
+        "total_len": sum(index["doc_len"]),
+        "df": {t: len(postings.get(t, ())) for t in sorted(set(terms))},
+    }
+
+
+def _score_jaccard(index: Dict[str, Any], q_tokens: List[str]) -> Dict[int, float]:
+    postings = index["postings"]
+    doc_uniq = index["doc_uniq"]
+
+    q_terms = set(q_tokens)
+    inter: Dict[int, int] = {}
+    for t in q_terms:
+        for pos, _tf in postings.get(t, ()):
+            inter[pos] = inter.get(pos, 0) + 1
+
+    n_q = len(q_terms)
+    return {pos: n / (n_q + doc_uniq[pos] - n) for pos, n in inter.items()}
+
+
+def _bm25_idf(n_docs: int, df: int) -> float:
+    return math.log(1.0 + (n_docs - df + 0.5) / (df + 0.5))
+
+
+def _score_bm25(
+    index: Dict[str, Any],
+    q_tokens: List[str],
+    stats: Dict[str, Any] | None = None,
+) -> Dict[int, float]:
+    """
+    BM25 over the index. ``stats`` (see ``index_stats``) may describe a
+    larger collection than ``index`` so that shards score on a common scale.
+    """
+    terms = sorted(set(q_tokens))
+    if stats is None:
+        stats = index_stats(index, terms)
+
+    n_docs = stats["n_docs"]
+    if not n_docs:
+        return {}
+    avgdl = stats["total_len"] / n_docs or 1.0
+    postings = index["postings"]
+    doc_len = index["doc_len"]
+
+    scores: Dict[int, float] = {}
+    for t in terms:
+        df = stats["df"].get(t, 0)
+        plist = postings.get(t)
+        if not df or not plist:
+            continue
+        idf = _bm25_idf(n_docs, df)
+        for pos, tf in plist:
+            norm = tf + BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len[pos] / avgdl)
+            scores[pos] = scores.get(pos, 0.0) + idf * tf * (BM25_K1 + 1.0) / norm
+    return scores
+
+
+def _top_k(scores: Dict[int, float], k: int | None) -> List[Tuple[float, int]]:
+    """Highest scores first; ties keep corpus order (stable-sort semantics)."""
+    scored = [(score, pos) for pos, score in scores.items() if score > 0]
+    key = lambda x: (-x[0], x[1])
+    if k is None:
+        return sorted(scored, key=key)
+    return heapq.nsmallest(k, scored, key=key)
+
+
+def search_index(
+    index: Dict[str, Any],
+    cases: Sequence,
+    q_tokens: List[str],
+    k: int | None,
+    scorer: str = "jaccard",
+    stats: Dict[str, Any] | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Rank ``cases`` (aligned with ``index``) for a tokenized query.
+
+    Each hit carries the case fields plus the pre-extracted ones, so callers
+    never need the corpus itself (which a sharded coordinator doesn't have).
+    """
+    if not q_tokens:
+        return []
+
+    if k is not None and TOP_K_PRUNING and len(index["doc_ids"]) >= TOP_K_PRUNING_MIN_DOCS:
+        return _make_hits(index, cases, _prune_top_k(index, q_tokens, k, scorer, stats))
+
+    if scorer == "bm25":
+        scores = _score_bm25(index, q_tokens, stats)
+    elif scorer == "jaccard":
+        scores = _score_jaccard(index, q_tokens)
+    else:
+        raise ValueError(f"Unknown scorer: {scorer!r}")
+
+    return _make_hits(index, cases, _top_k(scores, k))
+
+
+def _make_hits(
+    index: Dict[str, Any],
+    cases: Sequence,
+    ranked: List[Tuple[float, int]],
+) -> List[Dict[str, Any]]:
+    hits = []
+    for score, pos in ranked:
+        c = cases[pos]
+        hits.append(
+            {
+                "id": c["id"],
+                "score": score,
+                "dialogue": c["dialogue"],
+                "raw": c["raw"],
+                "chief_complaint": index["chief_complaint"][pos],
+                "symptoms": index["symptoms"][pos],
+                "medications": index["medications"][pos],
+            }
+        )
+    return hits
+
+
+# ---------------------------------------------------------------------
+# Safe top-k pruning (MaxScore)
+# ---------------------------------------------------------------------
+#
+# Document-at-a-time evaluation over the query's posting lists in doc_pos
+# order. Query terms are sorted by their score upper bound; once k hits
+# are held, the longest prefix of terms whose combined bound cannot beat
+# the k-th score is "non-essential": documents containing only those terms
+# are never visited, and for other candidates the non-essential lists are
+# probed (binary search) only while the candidate can still make the top k.
+#
+# The result equals _top_k over exhaustive scores, ties included: a bound
+# skips a document only when it is <= the k-th score, and documents arrive
+# in ascending doc_pos, so a later equal score loses the tie anyway.
+
+# Exhaustive scoring is kept for k=None and for comparison.
+TOP_K_PRUNING = os.environ.get("DOCTOR_PATIENT_TOP_K_PRUNING", "1") != "0"
+
+# Below this many docs the dict-accumulator scorers are faster than the
+# document-at-a-time bookkeeping (crossover measured at ~300-600 docs).
+TOP_K_PRUNING_MIN_DOCS = int(os.environ.get("DOCTOR_PATIENT_TOP_K_PRUNING_MIN_DOCS", "512"))
+
+# Relative slack on float bounds, so rounding can never make one too tight.
+_BOUND_SLACK = 1.0 + 1e-9
+
+
+def _maxscore_top_k(
+    plists: List[List[List[int]]],
+    ubs: List[float],
+    prefix_bounds: List[float],
+    weight: Callable[[int, int, int], float],
+    score: Callable[[int, List[Tuple[int, float]]], float],
+    doc_bound: Callable[[int, float], float],
+    k: int,
+    counters: Dict[str, int] | None = None,
+) -> List[Tuple[float, int]]:
+    """
+    MaxScore over ``plists`` (ordered by ascending upper bound ``ubs``).
+
+    ``prefix_bounds[i]`` bounds the score of a document matching only terms
+    ``0..i``; ``weight(i, pos, tf)`` is term i's contribution to ``pos``,
+    ``score(pos, [(i, w), ...])`` the exact score and ``doc_bound(pos, s)``
+    the best score ``pos`` can reach with contributions summing to ``s``.
+    """
+    m = len(plists)
+    cursors = [0] * m
+    remaining = list(accumulate(ubs))
+    heap: List[Tuple[float, int]] = []   # (score, -pos); heap[0] is the k-th hit
+    first_essential = 0
+    n_scored = 0
+
+    # Merge of the essential lists: (next doc_pos, term). Entries of terms
+    # that became non-essential are dropped when they surface.
+    frontier = [(pl[0][0], i) for i, pl in enumerate(plists) if pl]
+    heapq.heapify(frontier)
+
+    while frontier:
+        pos = frontier[0][0]
+        matched: List[Tuple[int, float]] = []
+        s = 0.0
+        while frontier and frontier[0][0] == pos:
+            i = heapq.heappop(frontier)[1]
+            if i < first_essential:
+                continue
+            pl = plists[i]
+            c = cursors[i]
+            w = weight(i, pos, pl[c][1])
+            matched.append((i, w))
+            s += w
+            c += 1
+            cursors[i] = c
+            if c < len(pl):
+                heapq.heappush(frontier, (pl[c][0], i))
+        if not matched:
+            continue
+
+        full = len(heap) >= k
+        pruned = False
+        for i in range(first_essential - 1, -1, -1):
+            if full and doc_bound(pos, s + remaining[i]) <= heap[0][0]:
+                pruned = True
+                break
+            pl = plists[i]
+            c = bisect_left(pl, [pos], cursors[i])
+            if c < len(pl) and pl[c][0] == pos:
+                w = weight(i, pos, pl[c][1])
+                matched.append((i, w))
+                s += w
+                c += 1
+            cursors[i] = c
+        if pruned:
+            continue
+
+        n_scored += 1
+        sc = score(pos, matched)
+        if not full:
+            heapq.heappush(heap, (sc, -pos))
+        elif sc > heap[0][0]:
+            heapq.heapreplace(heap, (sc, -pos))
+        else:
+            continue
+        if len(heap) >= k:
+            while first_essential < m and prefix_bounds[first_essential] <= heap[0][0]:
+                first_essential += 1
+            if first_essential >= m:
+                break
+
+    if counters is not None:
+        counters["scored"] = counters.get("scored", 0) + n_scored
+    return sorted(((sc, -neg) for sc, neg in heap), key=lambda x: (-x[0], x[1]))
+
+
+def _prune_top_k(
+    index: Dict[str, Any],
+    q_tokens: List[str],
+    k: int,
+    scorer: str = "jaccard",
+    stats: Dict[str, Any] | None = None,
+    counters: Dict[str, int] | None = None,
+) -> List[Tuple[float, int]]:
+    """Same result as ``_top_k(_score_<scorer>(...), k)``, via MaxScore."""
+    if k <= 0:
+        return []
+    postings = index["postings"]
+    bounds = index["bounds"]
+    terms = sorted(set(q_tokens))
+
+    if scorer == "jaccard":
+        doc_uniq = index["doc_uniq"]
+        n_q = len(terms)
+        terms = [t for t in terms if t in postings]
+        # Every term bounds a document by 1 match; spend the prefix on the
+        # most frequent terms, and tighten with their smallest doc_uniq.
+        terms.sort(key=lambda t: -len(postings[t]))
+        ubs = [1.0] * len(terms)
+        prefix_bounds = []
+        min_uniq = None
+        for i, t in enumerate(terms):
+            n = i + 1
+            min_uniq = bounds[t][2] if min_uniq is None else min(min_uniq, bounds[t][2])
+            prefix_bounds.append(n / (n_q + max(min_uniq, n) - n))
+
+        def weight(i: int, pos: int, tf: int) -> float:
+            return 1.0
+
+        def score(pos: int, matched: List[Tuple[int, float]]) -> float:
+            n = len(matched)
+            return n / (n_q + doc_uniq[pos] - n)
+
+        def doc_bound(pos: int, s: float) -> float:
+            return s / (n_q + doc_uniq[pos] - s)
+
+    elif scorer == "bm25":
+        if stats is None:
+            stats = index_stats(index, terms)
+        n_docs = stats["n_docs"]
+        if not n_docs:
+            return []
+        avgdl = stats["total_len"] / n_docs or 1.0
+        doc_len = index["doc_len"]
+
+        idfs = {}
+        for t in terms:
+            df = stats["df"].get(t, 0)
+            if df and t in postings:
+                idfs[t] = _bm25_idf(n_docs, df)
+        alpha = {t: r for r, t in enumerate(sorted(idfs))}
+
+        def term_ub(t: str) -> float:
+            max_tf, min_len, _ = bounds[t]
+            norm = max_tf + BM25_K1 * (1.0 - BM25_B + BM25_B * min_len / avgdl)
+            return idfs[t] * max_tf * (BM25_K1 + 1.0) / norm * _BOUND_SLACK
+
+        ranked_terms = sorted(((term_ub(t), -len(postings[t]), t) for t in idfs))
+        terms = [t for _, _, t in ranked_terms]
+        ubs = [ub for ub, _, _ in ranked_terms]
+        prefix_bounds = [b * _BOUND_SLACK for b in accumulate(ubs)]
+        term_idf = [idfs[t] for t in terms]
+        term_alpha = [alpha[t] for t in terms]
+
+        def weight(i: int, pos: int, tf: int) -> float:
+            norm = tf + BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len[pos] / avgdl)
+            return term_idf[i] * tf * (BM25_K1 + 1.0) / norm
+
+        def score(pos: int, matched: List[Tuple[int, float]]) -> float:
+            # Sum in term order, like _score_bm25, so scores are bit-identical.
+            total = 0.0
+            for _, w in sorted(matched, key=lambda x: term_alpha[x[0]]):
+                total += w
+            return total
+
+        def doc_bound(pos: int, s: float) -> float:
+            return s * _BOUND_SLACK
+
+    else:
+        raise ValueError(f"Unknown scorer: {scorer!r}")
+
+    return _maxscore_top_k(
+        [postings[t] for t in terms],
+        ubs,
+        prefix_bounds,
+        weight,
+        score,
+        doc_bound,
+        k,
+        counters,
+    )
+
+
+def bench_top_k_pruning(
+    queries: List[str] | None = None,
+    k: int = 3,
+    scorer: str | None = None,
+    repeat: int = 3,
+) -> Dict[str, float]:
+    """
+    Time pruned against exhaustive top-k on ``queries`` and check that both
+    return the same ranking. Defaults to summary-style queries: the symptom
+    phrases plus medications of every indexed case.
+    """
+    scorer = scorer or SCORER
+    index = _load_index()
+    if queries is None:
+        queries = [
+            " ".join(sym + meds)
+            for sym, meds in zip(index["symptoms"], index["medications"])
+        ]
+        queries = [q for q in queries if q]
+    token_lists = [t for t in (_tokenize(q) for q in queries) if t]
+    if not token_lists:
+        return {}
+
+    def exhaustive(tokens: List[str]) -> List[Tuple[float, int]]:
+        if scorer == "bm25":
+            return _top_k(_score_bm25(index, tokens), k)
+        return _top_k(_score_jaccard(index, tokens), k)
+
+    mismatches = sum(
+        exhaustive(t) != _prune_top_k(index, t, k, scorer) for t in token_lists
+    )
+    matched_docs = sum(
+        len({pos for term in set(t) for pos, _ in index["postings"].get(term, ())})
+        for t in token_lists
+    )
+    counters: Dict[str, int] = {}
+    for t in token_lists:
+        _prune_top_k(index, t, k, scorer, counters=counters)
+
+    def best_of(fn) -> float:
+        best = float("inf")
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        return max(best, 1e-9)
+
+    full_s = best_of(lambda: [exhaustive(t) for t in token_lists])
+    pruned_s = best_of(lambda: [_prune_top_k(index, t, k, scorer) for t in token_lists])
+
+    result = {
+        "queries": float(len(token_lists)),
+        "avg_terms": sum(len(set(t)) for t in token_lists) / len(token_lists),
+        "mismatches": float(mismatches),
+        "scored_fraction": counters.get("scored", 0) / max(matched_docs, 1),
+        "exhaustive_qps": len(token_lists) / full_s,
+        "pruned_qps": len(token_lists) / pruned_s,
+        "speedup": full_s / pruned_s,
+    }
+    print(
+        f"[retrieval] {len(token_lists)} queries ({scorer}, k={k}, "
+        f"{result['avg_terms']:.1f} terms avg): exhaustive {result['exhaustive_qps']:.0f} q/s, "
+        f"pruned {result['pruned_qps']:.0f} q/s (x{result['speedup']:.2f}), "
+        f"{100 * result['scored_fraction']:.1f}% of matching docs scored, "
+        f"{mismatches} mismatches"
+    )
+    return result
+
+
+# ---------------------------------------------------------------------
+# Sharded scatter-gather (see tools/shard_server.py for the node side)
+# ---------------------------------------------------------------------
+
+# Comma-separated node base URLs, e.g. "http://10.0.0.5:8701,http://10.0.0.6:8701".
+# Empty → search the local index.
+SHARD_URLS = [u.strip() for u in os.environ.get("DOCTOR_PATIENT_SHARDS", "").split(",") if u.strip()]
+
+# Per-shard budget for each scatter round, in seconds.
+SHARD_TIMEOUT_S = float(os.environ.get("DOCTOR_PATIENT_SHARD_TIMEOUT", "2.0"))
+
+_SHARD_POOL: ThreadPoolExecutor | None = None
+
+
+def _post_json(url: str, payload: Dict[str, Any], timeout: float) -> Any:
+    import urllib.request
+
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(payload).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    with urllib.request.urlopen(req, timeout=timeout) as resp:
+        return json.loads(resp.read().decode("utf-8"))
+
+
+def _scatter(
+    urls: List[str],
+    path: str,
+    payload: Dict[str, Any],
+    timeout: float,
+) -> List[Any]:
+    """POST ``payload`` to every shard; a slow or failed shard yields None."""
+    from concurrent.futures import ThreadPoolExecutor, wait
+
+    global _SHARD_POOL
+    if _SHARD_POOL is None:
+        _SHARD_POOL = ThreadPoolExecutor(max_workers=32, thread_name_prefix="shard")
+
+    futures = [
+        _SHARD_POOL.submit(_post_json, url.rstrip("/") + path, payload, timeout)
+        for url in urls
+    ]
+    done, _ = wait(futures, timeout=timeout)
+
+    results: List[Any] = []
+    for url, fut in zip(urls, futures):
+        if fut not in done:
+            print(f"[retrieval] shard {url} timed out after {timeout:.2f}s ({path})")
+            results.append(None)
             continue
-        for m in pattern.finditer(line):
-            name = m.group(1).strip(".,;:()[]")
-            if name and name not in _MED_STOPWORDS:
-                meds.add(name)
+        try:
+            results.append(fut.result())
+        except Exception as e:
+            print(f"[retrieval] shard {url} failed ({path}):", e)
+            results.append(None)
+    return results
+
+
+def search_shards(
+    q_tokens: List[str],
+    k: int,
+    urls: List[str] | None = None,
+    scorer: str | None = None,
+    timeout: float | None = None,
+) -> List[Dict[str, Any]]:
+    """
+    Fan a query out to shard nodes and merge their top-k.
+
+    For BM25 a first round collects document counts, lengths and per-term
+    document frequencies from every shard, and the summed statistics are
+    sent with the query so all shards share one IDF scale. Shards that miss
+    ``timeout`` are dropped from the answer instead of blocking it.
+    """
+    urls = urls if urls is not None else SHARD_URLS
+    scorer = scorer or SCORER
+    timeout = SHARD_TIMEOUT_S if timeout is None else timeout
+    if not q_tokens or not urls:
+        return []
+
+    stats = None
+    live = list(urls)
+    if scorer == "bm25":
+        terms = sorted(set(q_tokens))
+        parts = _scatter(live, "/stats", {"terms": terms}, timeout)
+        live = [u for u, p in zip(live, parts) if p is not None]
+        parts = [p for p in parts if p is not None]
+        stats = {
+            "n_docs": sum(p["n_docs"] for p in parts),
+            "total_len": sum(p["total_len"] for p in parts),
+            "df": {t: sum(p["df"].get(t, 0) for p in parts) for t in terms},
+        }
+
+    payload = {"tokens": q_tokens, "k": k, "scorer": scorer, "stats": stats}
+    hits: List[Dict[str, Any]] = []
+    for part in _scatter(live, "/search", payload, timeout):
+        if part is not None:
+            hits.extend(part.get("hits", []))
+
+    # Case ids follow corpus order, so this reproduces single-node tie-breaks.
+    return heapq.nsmallest(k, hits, key=lambda h: (-h["score"], h["id"]))
+
+
+def _search(q_tokens: List[str], k: int) -> List[Dict[str, Any]]:
+    if SHARD_URLS:
+        return search_shards(q_tokens, k)
+    if RETRIEVAL_UNIT == "turn":
+        return search_turns(q_tokens, k)
+    return search_index(_load_index(), _load_subjective_cases(), q_tokens, k, SCORER)
+
+
+# ---------------------------------------------------------------------
+# Turn-level index over [doctor]/[patient] turns
+# ---------------------------------------------------------------------
+#
+# Same layout as the case index (so the scorers above apply unchanged), but
+# one doc per turn of TURN_SPEAKERS, plus where the turn sits:
+#
+# {
+#   "version": int, "source": {...}, "speakers": [str, ...],
+#   "doc_ids": [case id, ...],                 # owning case of each turn
+#   "turn_case": [case doc_pos, ...],          # aligned with the case index
+#   "turn_no": [turn position in the dialogue, ...],
+#   "speaker": [str, ...],
+#   "span": [[start, end], ...],               # turn text in the dialogue
+#   "negated": [[term, ...], ...],             # terms only seen negated
+#   "doc_len": [...], "doc_uniq": [...], "postings": {...}, "bounds": {...}
+# }
+#
+# Turn scores roll up to their case as the best matching turn, and hits
+# carry the matching turns instead of the whole transcript.
+
+TURN_INDEX_VERSION = 2
+TURN_INDEX_PATH = DATA_DIR / "train_subjective.turns.json"
+
+# "case" scores whole transcripts; "turn" scores TURN_SPEAKERS' turns.
+RETRIEVAL_UNIT = os.environ.get("DOCTOR_PATIENT_RETRIEVAL_UNIT", "case")
+
+# Speakers whose turns are indexed ("patient": complaints are in the
+# patient's words; doctor boilerplate only dilutes them).
+TURN_SPEAKERS = tuple(
+    s.strip() for s in os.environ.get("DOCTOR_PATIENT_TURN_SPEAKERS", "patient").split(",") if s.strip()
+)
+
+# Matching turns returned per case hit.
+TURNS_PER_CASE = 3
+
+# Turns are a sentence or two, so overlap on function words ("i have a
+# ...") outweighs the complaint itself under Jaccard: turns are scored with
+# BM25 on the query's content terms.
+TURN_SCORER = os.environ.get("DOCTOR_PATIENT_TURN_SCORER", "bm25")
+
+# A turn counts as a match only if it holds this share of the query's idf
+# mass ("knee pain" is not answered by "no chest pain"). Cases without such
+# a turn fall back to case-level hits, with no "turns".
+MIN_TURN_COVERAGE = float(os.environ.get("DOCTOR_PATIENT_MIN_TURN_COVERAGE", "0.5"))
+
+_TURN_STOPWORDS = {
+    "a", "an", "the", "and", "or", "but", "of", "in", "on", "at", "to", "for",
+    "with", "from", "about", "since", "i", "im", "ive", "me", "my", "it", "its",
+    "this", "that", "is", "am", "are", "was", "be", "been", "have", "has", "had",
+    "do", "does", "did", "some", "very", "really", "just", "so", "like", "yeah",
+    "um", "uh", "okay", "day", "days", "week", "weeks", "month", "months", "ago",
+}
+
+_TURN_TAG_RE = re.compile(r"^\[([a-z_]+)\][ \t]*", re.M)
+
+# "no chest pain", "i do n't have a fever" (the corpus splits "n't"): terms
+# after a cue, up to the end of the clause, are negated.
+_NEGATION_CUES = {
+    "no", "not", "nt", "nope", "never", "without", "nothing",
+    "denies", "deny", "dont", "didnt", "havent", "hasnt",
+}
+_CLAUSE_RE = re.compile(r"[,.;:?!]|\bbut\b")
+
+_TURN_INDEX: Dict[str, Any] | None = None
+
+
+def split_turns(dialogue: str) -> List[Tuple[str, int, int]]:
+    """``(speaker, start, end)`` of every tagged turn; untagged lines continue the turn."""
+    tags = list(_TURN_TAG_RE.finditer(dialogue))
+    turns = []
+    for i, m in enumerate(tags):
+        end = tags[i + 1].start() if i + 1 < len(tags) else len(dialogue)
+        turns.append((m.group(1), m.end(), end))
+    return turns
+
+
+def _negated_terms(text: str) -> List[str]:
+    """Terms of ``text`` that only occur inside a negated clause."""
+    seen: Set[str] = set()
+    negated: Set[str] = set()
+    for clause in _CLAUSE_RE.split(text.lower()):
+        in_scope = False
+        for t in _tokenize(clause):
+            if t in _NEGATION_CUES:
+                in_scope = True
+            elif in_scope:
+                negated.add(t)
+            else:
+                seen.add(t)
+    return sorted(negated - seen)
+
+
+def build_turn_index(
+    cases: Iterable[Dict[str, Any]] | None = None,
+    speakers: Iterable[str] = TURN_SPEAKERS,
+) -> Dict[str, Any]:
+    if cases is None:
+        cases = iter_subjective_cases()
+    speakers = sorted(set(speakers))
+
+    index: Dict[str, Any] = {
+        "version": TURN_INDEX_VERSION,
+        "source": _corpus_fingerprint(),
+        "speakers": speakers,
+        "doc_ids": [],
+        "turn_case": [],
+        "turn_no": [],
+        "speaker": [],
+        "span": [],
+        "doc_len": [],
+        "doc_uniq": [],
+    }
+    postings: Dict[str, List[List[int]]] = {}
+    negated: List[List[str]] = []
+
+    started = time.perf_counter()
+    n_cases = 0
+    for case_pos, c in enumerate(cases):
+        n_cases += 1
+        dialogue = c["dialogue"]
+        for turn_no, (speaker, start, end) in enumerate(split_turns(dialogue)):
+            if speaker not in speakers:
+                continue
+            tokens = _tokenize(dialogue[start:end])
+            if not tokens:
+                continue
+            tf: Dict[str, int] = {}
+            for t in tokens:
+                tf[t] = tf.get(t, 0) + 1
+            pos = len(index["doc_ids"])
+            negated.append(_negated_terms(dialogue[start:end]))
+            for t, n in tf.items():
+                postings.setdefault(t, []).append([pos, n])
+
+            index["doc_ids"].append(c["id"])
+            index["turn_case"].append(case_pos)
+            index["turn_no"].append(turn_no)
+            index["speaker"].append(speaker)
+            index["span"].append([start, end])
+            index["doc_len"].append(len(tokens))
+            index["doc_uniq"].append(len(tf))
+
+    index["negated"] = negated
+    index["postings"] = {t: postings[t] for t in sorted(postings)}
+    index["bounds"] = _term_bounds(index)
+
+    n_postings = sum(len(p) for p in postings.values())
+    print(
+        f"[retrieval] Built turn index: {len(index['doc_ids'])} {'/'.join(speakers)} turns "
+        f"from {n_cases} cases, {len(postings)} terms, {n_postings} postings "
+        f"in {time.perf_counter() - started:.2f}s"
+    )
+    return index
+
+
+def load_turn_index(path: Path = TURN_INDEX_PATH) -> Dict[str, Any] | None:
+    """Load a persisted turn index if it matches the corpus and speakers, else None."""
+    if not path.exists() or not SUBJ_PATH.exists():
+        return None
+    with path.open("r", encoding="utf-8") as f:
+        index = json.load(f)
+    if index.get("version") != TURN_INDEX_VERSION:
+        return None
+    if index.get("source") != _corpus_fingerprint():
+        return None
+    if index.get("speakers") != sorted(set(TURN_SPEAKERS)):
+        return None
+    return index
+
+
+def _load_turn_index() -> Dict[str, Any]:
+    global _TURN_INDEX
+    if _TURN_INDEX is not None:
+        return _TURN_INDEX
+
+    index = load_turn_index()
+    if index is None:
+        index = build_turn_index()
+    else:
+        print(f"[retrieval] Loaded turn index for {len(index['doc_ids'])} turns from {TURN_INDEX_PATH}")
+    _TURN_INDEX = index
+    return _TURN_INDEX
+
+
+def search_turns(
+    q_tokens: List[str],
+    k: int | None,
+    scorer: str | None = None,
+    turns_per_case: int = TURNS_PER_CASE,
+) -> List[Dict[str, Any]]:
+    """
+    Case hits ranked by their best matching turn. Each hit is a
+    ``search_index`` hit plus ``"turns"``: its top ``turns_per_case``
+    matching turns (speaker, position, text, score) in dialogue order.
+
+    Turns are scored with ``scorer`` (default TURN_SCORER). Only turns
+    covering MIN_TURN_COVERAGE of the query's content terms (by idf, not
+    counting terms the turn negates) count; remaining slots are filled with
+    case-level hits (SCORER) that carry no ``"turns"``.
+
+    ``"match"`` says which: ``"turn"`` hits come first, then ``"case"``
+    hits, each in their own score order. Scores are only comparable
+    between hits with the same ``"match"``.
+    """
+    scorer = scorer or TURN_SCORER
+    terms = [t for t in q_tokens if t not in _TURN_STOPWORDS]
+    if not terms:
+        hits = search_index(_load_index(), _load_subjective_cases(), q_tokens, k, SCORER)
+        for hit in hits:
+            hit["match"] = "case"
+        return hits
+
+    tindex = _load_turn_index()
+    if scorer == "bm25":
+        scores = _score_bm25(tindex, terms)
+    elif scorer == "jaccard":
+        scores = _score_jaccard(tindex, terms)
+    else:
+        raise ValueError(f"Unknown scorer: {scorer!r}")
+
+    n_turns = len(tindex["doc_ids"])
+    postings = tindex["postings"]
+    idf = {t: _bm25_idf(n_turns, len(postings[t])) for t in set(terms) if t in postings}
+    total_idf = sum(idf.values())
+    negated = tindex["negated"]
+    covered: Dict[int, float] = {}
+    for t, w in idf.items():
+        for turn, _ in postings[t]:
+            if t not in negated[turn]:
+                covered[turn] = covered.get(turn, 0.0) + w
+
+    turn_case = tindex["turn_case"]
+    by_case: Dict[int, List[Tuple[float, int]]] = {}
+    for turn, score in scores.items():
+        if covered.get(turn, 0.0) >= MIN_TURN_COVERAGE * total_idf:
+            by_case.setdefault(turn_case[turn], []).append((score, turn))
+    case_scores = {pos: max(score for score, _ in turns) for pos, turns in by_case.items()}
+
+    ranked = _top_k(case_scores, k)
+    cases = _load_subjective_cases()
+    hits = _make_hits(_load_index(), cases, ranked)
+    for hit, (_, pos) in zip(hits, ranked):
+        best = sorted(by_case[pos], key=lambda x: (-x[0], x[1]))[:turns_per_case]
+        dialogue = cases[pos]["dialogue"]
+        hit["match"] = "turn"
+        hit["turns"] = [
+            {
+                "speaker": tindex["speaker"][turn],
+                "position": tindex["turn_no"][turn],
+                "text": dialogue[tindex["span"][turn][0]:tindex["span"][turn][1]].strip(),
+                "score": score,
+            }
+            for score, turn in sorted(best, key=lambda x: x[1])
+        ]
+
+    if k is None or len(hits) < k:
+        seen = {h["id"] for h in hits}
+        rest = search_index(_load_index(), cases, q_tokens, None if k is None else k + len(seen), SCORER)
+        for hit in rest:
+            if hit["id"] not in seen:
+                hit["match"] = "case"
+                hits.append(hit)
+        if k is not None:
+            del hits[k:]
+    return hits
+
+
+# ---------------------------------------------------------------------
+# Batched multi-query retrieval
+# ---------------------------------------------------------------------
+
+def _score_many(
+    index: Dict[str, Any],
+    token_lists: List[List[str]],
+    scorer: str,
+) -> List[Dict[int, float]]:
+    """
+    Score several queries in one pass over the postings of their combined
+    vocabulary. Each posting list is walked once and each per-(term, doc)
+    weight computed once, then added to every query that contains the term.
+    Per-query scores are identical to ``_score_jaccard`` / ``_score_bm25``.
+    """
+    term_queries: Dict[str, List[int]] = {}
+    for qi, tokens in enumerate(token_lists):
+        for t in set(tokens):
+            term_queries.setdefault(t, []).append(qi)
+
+    postings = index["postings"]
+    acc: List[Dict[int, float]] = [{} for _ in token_lists]
+
+    if scorer == "jaccard":
+        for t in sorted(term_queries):
+            plist = postings.get(t)
+            if not plist:
+                continue
+            targets = [acc[qi] for qi in term_queries[t]]
+            if len(targets) == 1:
+                a = targets[0]
+                for pos, _tf in plist:
+                    a[pos] = a.get(pos, 0) + 1
+                continue
+            for pos, _tf in plist:
+                for a in targets:
+                    a[pos] = a.get(pos, 0) + 1
+
+        doc_uniq = index["doc_uniq"]
+        out = []
+        for tokens, inter in zip(token_lists, acc):
+            n_q = len(set(tokens))
+            out.append({pos: n / (n_q + doc_uniq[pos] - n) for pos, n in inter.items()})
+        return out
+
+    if scorer != "bm25":
+        raise ValueError(f"Unknown scorer: {scorer!r}")
+
+    stats = index_stats(index, term_queries)
+    n_docs = stats["n_docs"]
+    if not n_docs:
+        return acc
+    avgdl = stats["total_len"] / n_docs or 1.0
+    doc_len = index["doc_len"]
+
+    for t in sorted(term_queries):
+        df = stats["df"].get(t, 0)
+        plist = postings.get(t)
+        if not df or not plist:
+            continue
+        idf = _bm25_idf(n_docs, df)
+        targets = [acc[qi] for qi in term_queries[t]]
+        for pos, tf in plist:
+            w = (idf * tf * (BM25_K1 + 1.0)
+                 / (tf + BM25_K1 * (1.0 - BM25_B + BM25_B * doc_len[pos] / avgdl)))
+            for a in targets:
+                a[pos] = a.get(pos, 0.0) + w
+    return acc
+
+
+def search_many(
+    queries: List[str],
+    k: int = 5,
+    scorer: str | None = None,
+) -> List[List[Dict[str, Any]]]:
+    """
+    Top-k hits for each of ``queries`` (same hit format as the single-query
+    helpers), scored together in one pass over the index.
+
+    Batching is case-level only: with SHARD_URLS, or RETRIEVAL_UNIT "turn"
+    (turn hits need search_turns' coverage filter), queries run one by one.
+    """
+    scorer = scorer or SCORER
+    token_lists = [_tokenize(q) for q in queries]
+
+    if SHARD_URLS:
+        return [search_shards(t, k, scorer=scorer) if t else [] for t in token_lists]
+    if RETRIEVAL_UNIT == "turn":
+        return [search_turns(t, k) if t else [] for t in token_lists]
+
+    index = _load_index()
+    cases = _load_subjective_cases()
+    return [
+        _make_hits(index, cases, _top_k(scores, k))
+        for scores in _score_many(index, token_lists, scorer)
+    ]
+
+
+def bench_search_many(
+    queries: List[str] | None = None,
+    k: int = 5,
+    scorer: str | None = None,
+    repeat: int = 3,
+) -> Dict[str, float]:
+    """
+    Compare queries/second of ``search_many`` against one search per query.
+
+    Defaults to the CHIEF COMPLAINT line of every note in the corpus.
+    """
+    scorer = scorer or SCORER
+    if queries is None:
+        queries = [
+            _extract_chief_complaint_text(c["raw"].get("tgt") or "")
+            for c in _load_subjective_cases()
+        ]
+        queries = [q for q in queries if q]
+    if not queries:
+        return {}
+
+    index = _load_index()
+    cases = _load_subjective_cases()
+
+    def best_of(fn) -> float:
+        best = float("inf")
+        for _ in range(max(1, repeat)):
+            t0 = time.perf_counter()
+            fn()
+            best = min(best, time.perf_counter() - t0)
+        return max(best, 1e-9)
+
+    loop_s = best_of(
+        lambda: [search_index(index, cases, _tokenize(q), k, scorer) for q in queries]
+    )
+    batch_s = best_of(lambda: search_many(queries, k, scorer))
+
+    result = {
+        "queries": float(len(queries)),
+        "loop_qps": len(queries) / loop_s,
+        "batch_qps": len(queries) / batch_s,
+        "speedup": loop_s / batch_s,
+    }
+    print(
+        f"[retrieval] {len(queries)} queries ({scorer}): "
+        f"loop {result['loop_qps']:.0f} q/s, batch {result['batch_qps']:.0f} q/s "
+        f"(x{result['speedup']:.2f})"
+    )
+    return result
+
+
+# ---------------------------------------------------------------------
+# Symptom-term × medication co-occurrence table
+# ---------------------------------------------------------------------
+#
+# Built offline from the index postings and persisted next to it:
+#
+# {
+#   "version": int,
+#   "source": {...},                       # same fingerprint as the index
+#   "n_docs": int,
+#   "med_df": {med: n_docs_mentioning},
+#   "weights": {term: [[med, weight, count, case_id], ...]}   # weight-descending
+# }
+#
+# case_id is the first case where the term and the medication co-occur.
+#
+# weight = PPMI(term, med) * log(1 + count), so one-off pairs between a
+# rare word and a rare drug don't dominate the ranking.
+
+COOCCUR_VERSION = 3
+COOCCUR_PATH = DATA_DIR / "train_subjective.cooccur.json"
+
+# Medications kept per term (highest weight first).
+COOCCUR_TOP_MEDS = 64
+
+# Drug candidates returned by get_candidate_drugs_for_symptoms.
+MAX_DRUG_CANDIDATES = 10
+
+_COOCCUR: Dict[str, Any] | None = None
+
+
+def build_cooccurrence(index: Dict[str, Any]) -> Dict[str, Any]:
+    meds = index["medications"]
+    doc_ids = index["doc_ids"]
+    n_docs = len(doc_ids)
+
+    med_df: Dict[str, int] = {}
+    for doc_meds in meds:
+        for m in doc_meds:
+            med_df[m] = med_df.get(m, 0) + 1
+
+    weights: Dict[str, List[List[Any]]] = {}
+    if med_df:
+        for term, plist in index["postings"].items():
+            counts: Dict[str, int] = {}
+            first_case: Dict[str, int] = {}
+            for pos, _tf in plist:
+                for m in meds[pos]:
+                    counts[m] = counts.get(m, 0) + 1
+                    first_case.setdefault(m, doc_ids[pos])
+            if not counts:
+                continue
+
+            df = len(plist)
+            row = []
+            for m, n in counts.items():
+                pmi = math.log(n * n_docs / (df * med_df[m]))
+                if pmi > 0:
+                    row.append([m, pmi * math.log1p(n), n, first_case[m]])
+            if row:
+                row.sort(key=lambda x: (-x[1], x[0]))
+                weights[term] = row[:COOCCUR_TOP_MEDS]
+
+    return {
+        "version": COOCCUR_VERSION,
+        "source": index.get("source", {}),
+        "n_docs": n_docs,
+        "med_df": {m: med_df[m] for m in sorted(med_df)},
+        "weights": weights,
+    }
 
-    return sorted(meds)
+
+def load_cooccurrence(path: Path = COOCCUR_PATH) -> Dict[str, Any] | None:
+    """Load a persisted table if it matches the current corpus, else None."""
+    if not path.exists() or not SUBJ_PATH.exists():
+        return None
+    with path.open("r", encoding="utf-8") as f:
+        table = json.load(f)
+    if table.get("version") != COOCCUR_VERSION:
+        return None
+    if table.get("source") != _corpus_fingerprint():
+        return None
+    return table
+
+
+def _load_cooccurrence() -> Dict[str, Any] | None:
+    """Persisted table, else built from the local index (None when sharded)."""
+    global _COOCCUR
+    if _COOCCUR is not None:
+        return _COOCCUR
+
+    table = load_cooccurrence()
+    if table is not None:
+        print(f"[retrieval] Loaded co-occurrence table from {COOCCUR_PATH}")
+    elif not SHARD_URLS:
+        table = build_cooccurrence(_load_index())
+    _COOCCUR = table
+    return _COOCCUR
+
+
+def rank_medications(
+    q_tokens: List[str],
+    table: Dict[str, Any],
+) -> List[Tuple[str, float, int]]:
+    """
+    Sum each medication's weight over the query terms; best first. Each
+    entry is ``(med, score, case_id)``, the case being one where the
+    medication co-occurs with its highest-weight query term.
+    """
+    weights = table["weights"]
+    scores: Dict[str, float] = {}
+    evidence: Dict[str, Tuple[float, int]] = {}
+    for t in sorted(set(q_tokens)):
+        for m, w, _n, case_id in weights.get(t, ()):
+            scores[m] = scores.get(m, 0.0) + w
+            if m not in evidence or w > evidence[m][0]:
+                evidence[m] = (w, case_id)
+    ranked = sorted(scores.items(), key=lambda x: (-x[1], x[0]))
+    return [(m, score, evidence[m][1]) for m, score in ranked]
 
 
 # ---------------------------------------------------------------------
@@ -181,18 +1765,30 @@ def get_dialogues_and_raw_for_chief_complaint(
     if not chief_complaint:
         return []
 
-    cases = _load_subjective_cases()
     q_tokens = _tokenize(chief_complaint)
 
-    scored = []
-    for c in cases:
-        tokens = _tokenize(c["dialogue"])
-        score = _jaccard_similarity(q_tokens, tokens)
-        if score > 0:
-            scored.append((score, c))
+    return _search(q_tokens, k)
+
+
+def get_patient_turns_for_chief_complaint(
+    chief_complaint: str,
+    k: int = 2,
+) -> List[Dict[str, Any]]:
+    """
+    Like get_dialogues_and_raw_for_chief_complaint, but matched against
+    patient turns only; each hit's ``"turns"`` holds the matching turns.
+    Hits without a good enough turn, and all hits in sharded deployments
+    (no turn index there), are plain case hits with no "turns"; callers
+    fall back to the dialogue snippet.
+    """
+    chief_complaint = (chief_complaint or "").strip()
+    if not chief_complaint:
+        return []
 
-    scored.sort(reverse=True, key=lambda x: x[0])
-    return [c for _, c in scored[:k]]
+    q_tokens = _tokenize(chief_complaint)
+    if SHARD_URLS:
+        return search_shards(q_tokens, k)
+    return search_turns(q_tokens, k)
 
 
 # ---------------------------------------------------------------------
@@ -207,34 +1803,42 @@ def get_candidate_symptoms_for_chief_complaint(
     if not chief_complaint:
         return []
 
-    cases = _load_subjective_cases()
     q_tokens = _tokenize(chief_complaint)
 
-    scored = []
-    for c in cases:
-        tokens = _tokenize(c["dialogue"])
-        score = _jaccard_similarity(q_tokens, tokens)
-        if score > 0:
-            scored.append((score, c))
-
-    scored.sort(reverse=True, key=lambda x: x[0])
-    top = [c for _, c in scored[:max_cases]]
-
     out = []
     seen = set()
 
-    for c in top:
+    for c in _search(q_tokens, max_cases):
         txt = c["dialogue"]
+        tgt = c["raw"].get("tgt") or ""
 
-        cc = _extract_chief_complaint_text(txt)
+        # Prefer the dialogue's own complaint, then the note's, then a snippet.
+        cc = c["chief_complaint"] or _extract_chief_complaint_text(tgt)
         if not cc:
             cc = txt[:80] + "..." if len(txt) > 80 else txt
 
         name = cc.strip()
         if name and name not in seen:
             seen.add(name)
-            out.append({"name": name, "case_id": c["id"]})
+            out.append(
+                {
+                    "name": name,
+                    "case_id": c["id"],
+                    "symptoms": c["symptoms"] or _note_symptom_phrases(tgt),
+                }
+            )
+
+    return out
+
 
+def _note_symptom_phrases(tgt: str) -> List[str]:
+    """'Endorses ...' findings of a note, one short phrase each."""
+    out: List[str] = []
+    for seg in _extract_symptom_phrases(tgt):
+        for part in seg.split("Endorses"):
+            phrase = part.split(". ", 1)[0].strip(" .:-,")
+            if phrase and phrase not in out:
+                out.append(phrase)
     return out
 
 
@@ -245,96 +1849,122 @@ def get_candidate_symptoms_for_chief_complaint(
 def get_candidate_drugs_for_symptoms(
     selected_symptoms: List[str],
     max_cases: int = 10,
+    limit: int = MAX_DRUG_CANDIDATES,
 ) -> List[Dict[str, Any]]:
     selected_symptoms = selected_symptoms or []
     if not selected_symptoms:
         return []
 
-    cases = _load_subjective_cases()
     q_tokens = _tokenize(" ".join(selected_symptoms))
 
-    scored = []
-    for c in cases:
-        tokens = _tokenize(c["dialogue"])
-        score = _jaccard_similarity(q_tokens, tokens)
-        if score > 0:
-            scored.append((score, c))
-
-    scored.sort(reverse=True, key=lambda x: x[0])
-    top = [c for _, c in scored[:max_cases]]
+    # Corpus-wide association from the precomputed table; ``max_cases``
+    # only applies to the retrieval fallback below.
+    table = _load_cooccurrence()
+    if table is not None:
+        return [
+            {"name": m, "case_id": case_id, "score": score}
+            for m, score, case_id in rank_medications(q_tokens, table)[:limit]
+        ]
 
     out = []
     seen = set()
 
-    for c in top:
-        meds = _extract_medications(c["dialogue"])
-        for m in meds:
+    for c in _search(q_tokens, max_cases):
+        for m in c["medications"]:
             if m not in seen:
                 seen.add(m)
                 out.append({"name": m, "case_id": c["id"]})
 
-    return out
+    return out[:limit]
 
 
 # ---------------------------------------------------------------------
 # 4) Similar cases for summary (subjective only)
 # ---------------------------------------------------------------------
 
+def _summary_case(c: Dict[str, Any], cc: str, sym: List[str], meds: List[str]) -> Dict[str, Any]:
+    return {
+        "chief_complaint": cc,
+        "symptoms": sym,
+        "medications": meds,
+        "drugs": meds,
+        "objective": {"medications": meds},
+        "raw": c["raw"],
+    }
+
+
 def get_similar_cases_for_summary(
     selected_symptoms: List[str],
     selected_drugs: List[str],
     max_cases: int = 3,
 ) -> List[Dict[str, Any]]:
-    cases = _load_subjective_cases()
-
     query_bits = (selected_symptoms or []) + (selected_drugs or [])
     q_tokens = _tokenize(" ".join(query_bits))
 
-    # If nothing chosen → return first N subjective cases
+    # If nothing chosen → return first N subjective cases (available while
+    # the corpus is still streaming in, no index needed)
     if not query_bits:
         out = []
-        for c in cases[:max_cases]:
+        for c in islice(iter_subjective_cases(), max_cases):
             txt = c["dialogue"]
-            cc = _extract_chief_complaint_text(txt)
-            sym = _extract_symptom_phrases(txt)
-            meds = _extract_medications(txt)
             out.append(
-                {
-                    "chief_complaint": cc,
-                    "symptoms": sym,
-                    "medications": meds,
-                    "drugs": meds,
-                    "objective": {"medications": meds},
-                    "raw": c["raw"],
-                }
+                _summary_case(
+                    c,
+                    _extract_chief_complaint_text(txt),
+                    _extract_symptom_phrases(txt),
+                    extract_medications(txt),
+                )
             )
         return out
 
-    scored = []
-    for c in cases:
-        tokens = _tokenize(c["dialogue"])
-        score = _jaccard_similarity(q_tokens, tokens)
-        if score > 0:
-            scored.append((score, c))
-
-    scored.sort(reverse=True, key=lambda x: x[0])
-    top = [c for _, c in scored[:max_cases]]
-
     out = []
-    for c in top:
-        txt = c["dialogue"]
-        cc = _extract_chief_complaint_text(txt)
-        sym = _extract_symptom_phrases(txt)
-        meds = _extract_medications(txt)
+    for c in _search(q_tokens, max_cases):
         out.append(
-            {
-                "chief_complaint": cc,
-                "symptoms": sym,
-                "medications": meds,
-                "drugs": meds,
-                "objective": {"medications": meds},
-                "raw": c["raw"],
-            }
+            _summary_case(c, c["chief_complaint"], c["symptoms"], c["medications"])
         )
 
     return out
+
+
+# ---------------------------------------------------------------------
+# CLI: offline index build
+# ---------------------------------------------------------------------
+
+def main(argv: List[str] | None = None) -> None:
+    """
+    Build and persist the medication lexicon, retrieval index,
+    co-occurrence table and turn index.
+
+    python -m doctor_patient.tools.retrieval [--workers N] [--chunk-size N] [--out PATH]
+    """
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Build the subjective-case retrieval index.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk-size", type=int, default=INDEX_CHUNK_SIZE)
+    parser.add_argument("--out", type=Path, default=INDEX_PATH)
+    parser.add_argument("--cooccur-out", type=Path, default=COOCCUR_PATH)
+    parser.add_argument("--medlex-out", type=Path, default=MEDLEX_PATH)
+    parser.add_argument("--turns-out", type=Path, default=TURN_INDEX_PATH)
+    args = parser.parse_args(argv)
+
+    lexicon = _load_med_lexicon()
+    save_index(
+        {"version": MEDLEX_VERSION, "source": _corpus_fingerprint(), "names": lexicon},
+        args.medlex_out,
+    )
+    print(f"[retrieval] Wrote medication lexicon ({len(lexicon)} names) to {args.medlex_out}")
+
+    index = build_index(workers=args.workers, chunk_size=args.chunk_size, lexicon=lexicon)
+    save_index(index, args.out)
+    print(f"[retrieval] Wrote index to {args.out}")
+
+    save_index(build_cooccurrence(index), args.cooccur_out)
+    print(f"[retrieval] Wrote co-occurrence table to {args.cooccur_out}")
+
+    save_index(build_turn_index(), args.turns_out)
+    print(f"[retrieval] Wrote turn index to {args.turns_out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# src/doctor_patient/tools/shard_server.py
+"""
+Retrieval shard node.
+
+Serves one partition of the subjective corpus (cases with
+``id % num_shards == shard``) over a tiny JSON/HTTP API that the
+coordinator in ``retrieval.search_shards`` fans out to:
+
+    GET  /health  -> {"shard": int, "num_shards": int, "n_docs": int}
+    POST /stats   {"terms": [...]}                        -> retrieval.index_stats(...)
+    POST /search  {"tokens": [...], "k": int,
+                   "scorer": str, "stats": {...} | null}  -> {"hits": [...]}
+
+Run a node:
+
+    python -m doctor_patient.tools.shard_server --shard 0 --num-shards 3 --port 8701
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+from . import med_lexicon, retrieval
+
+
+def load_partition(
+    shard: int,
+    num_shards: int,
+    path: Path = retrieval.SUBJ_PATH,
+) -> List[Dict[str, Any]]:
+    """Stream the corpus, keeping only this shard's cases in memory."""
+    return [
+        c
+        for c in retrieval._normalize_subjective_cases(retrieval._iter_json_items(path))
+        if c["id"] % num_shards == shard
+    ]
+
+
+def make_handler(
+    shard: int,
+    num_shards: int,
+    index: Dict[str, Any],
+    cases: List[Dict[str, Any]],
+) -> type:
+    class ShardHandler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload: Any) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path != "/health":
+                self._reply(404, {"error": f"unknown path {self.path}"})
+                return
+            self._reply(
+                200,
+                {"shard": shard, "num_shards": num_shards, "n_docs": len(cases)},
+            )
+
+        def do_POST(self) -> None:
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._reply(400, {"error": "invalid JSON body"})
+                return
+
+            if self.path == "/stats":
+                self._reply(200, retrieval.index_stats(index, body.get("terms") or []))
+            elif self.path == "/search":
+                try:
+                    hits = retrieval.search_index(
+                        index,
+                        cases,
+                        body.get("tokens") or [],
+                        int(body.get("k") or 10),
+                        body.get("scorer") or "jaccard",
+                        body.get("stats"),
+                    )
+                except ValueError as e:
+                    self._reply(400, {"error": str(e)})
+                    return
+                self._reply(200, {"hits": hits})
+            else:
+                self._reply(404, {"error": f"unknown path {self.path}"})
+
+        def log_message(self, format: str, *args: Any) -> None:
+            # Keep shard logs to startup/errors; one line per query is noise.
+            pass
+
+    return ShardHandler
+
+
+def serve(
+    shard: int,
+    num_shards: int,
+    host: str = "127.0.0.1",
+    port: int = 8701,
+    path: Path = retrieval.SUBJ_PATH,
+) -> None:
+    if not 0 <= shard < num_shards:
+        raise ValueError(f"shard must be in [0, {num_shards}), got {shard}")
+
+    cases = load_partition(shard, num_shards, path)
+    # Every node must normalize the same names: the offline corpus-wide
+    # lexicon when it matches this shard's data file, else the listed names
+    # (the coordinator's fallback too), never names mined from one partition.
+    lexicon = retrieval.load_med_lexicon(data_path=path) or med_lexicon.load_names()
+    index = retrieval.build_index(cases, lexicon=lexicon)
+    handler = make_handler(shard, num_shards, index, cases)
+
+    server = ThreadingHTTPServer((host, port), handler)
+    print(
+        f"[shard {shard}/{num_shards}] Serving {len(cases)} cases "
+        f"on http://{host}:{port}"
+    )
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+def spawn_local_shards(
+    num_shards: int,
+    base_port: int = 8701,
+    host: str = "127.0.0.1",
+    ready_timeout: float = 30.0,
+) -> Tuple[List[subprocess.Popen], List[str]]:
+    """
+    Start ``num_shards`` node processes on consecutive local ports and wait
+    until each answers /health. Returns ``(processes, base_urls)``; the
+    caller is responsible for terminating the processes.
+    """
+    env = dict(os.environ)
+    src_root = str(retrieval.SRC_ROOT)
+    env["PYTHONPATH"] = os.pathsep.join(p for p in (src_root, env.get("PYTHONPATH")) if p)
+
+    procs: List[subprocess.Popen] = []
+    urls: List[str] = []
+    for shard in range(num_shards):
+        port = base_port + shard
+        procs.append(
+            subprocess.Popen(
+                [
+                    sys.executable, "-m", "doctor_patient.tools.shard_server",
+                    "--shard", str(shard),
+                    "--num-shards", str(num_shards),
+                    "--host", host,
+                    "--port", str(port),
+                ],
+                env=env,
+            )
+        )
+        urls.append(f"http://{host}:{port}")
+
+    deadline = time.monotonic() + ready_timeout
+    for proc, url in zip(procs, urls):
+        while True:
+            try:
+                with urllib.request.urlopen(url + "/health", timeout=1.0):
+                    break
+            except OSError:
+                if proc.poll() is not None or time.monotonic() > deadline:
+                    for p in procs:
+                        p.terminate()
+                    raise RuntimeError(f"Shard at {url} did not become ready")
+                time.sleep(0.1)
+
+    return procs, urls
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve one retrieval shard over HTTP.")
+    parser.add_argument("--shard", type=int, required=True)
+    parser.add_argument("--num-shards", type=int, required=True)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8701)
+    parser.add_argument("--data", type=Path, default=retrieval.SUBJ_PATH)
+    args = parser.parse_args(argv)
+
+    serve(args.shard, args.num_shards, args.host, args.port, args.data)
+
+
+if __name__ == "__main__":
+    main()
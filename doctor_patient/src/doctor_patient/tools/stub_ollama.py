@@ -0,0 +1,275 @@
+# src/doctor_patient/tools/stub_ollama.py
+"""
+Stub Ollama server for load tests.
+
+Answers ``POST /api/chat`` the way crew.py expects (blocking or streamed
+NDJSON, ``done`` line with eval counters) without a model, with tunable
+latency:
+
+    queue    - at most ``parallel`` requests generate at once (Ollama's
+               OLLAMA_NUM_PARALLEL); the rest wait for a slot
+    ttft_ms  - prompt evaluation before the first chunk
+    token_ms - per generated chunk
+    jitter   - both scaled by a lognormal factor with this sigma
+
+``error_rate`` answers HTTP 500 and ``bad_json_rate`` returns symptom
+options that don't parse, to exercise the cascade and the retrieval-only
+fallbacks. The step is read from the "STEP: <name>" line of the last user
+message.
+
+    python -m doctor_patient.tools.stub_ollama --port 11435 --ttft-ms 300 --token-ms 15
+
+``GET /stats`` returns request / error counts and slot queueing.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Tuple
+
+_STEP_RE = re.compile(r"^STEP:\s*(\S+)", re.M)
+
+SYMPTOM_REPLY = json.dumps(
+    {
+        "symptom_options": [
+            "pain that worsens with activity",
+            "swelling around the area",
+            "stiffness in the morning",
+            "tiredness during the day",
+            "trouble sleeping",
+        ]
+    }
+)
+
+SUMMARY_REPLY = """\
+S (Subjective): Patient reports the chief complaint with the confirmed
+symptoms listed above. Medication history as confirmed.
+O (Objective): Not available in this stub; no examination recorded.
+A (Assessment): Presentation resembles the similar historical cases.
+P (Plan): Clinician may consider physical examination and follow-up with a
+primary care physician."""
+
+
+class StubState:
+    """Latency settings plus counters shared by all handler threads."""
+
+    def __init__(
+        self,
+        ttft_ms: float = 300.0,
+        token_ms: float = 15.0,
+        jitter: float = 0.2,
+        parallel: int = 4,
+        error_rate: float = 0.0,
+        bad_json_rate: float = 0.0,
+        seed: int | None = None,
+    ) -> None:
+        self.ttft_ms = ttft_ms
+        self.token_ms = token_ms
+        self.jitter = jitter
+        self.parallel = max(1, parallel)
+        self.error_rate = error_rate
+        self.bad_json_rate = bad_json_rate
+        self._rng = random.Random(seed)
+        self._slots = threading.BoundedSemaphore(self.parallel)
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        """Zero the counters (e.g. after a warm-up request)."""
+        self.stats: Dict[str, float] = {
+            "requests": 0,
+            "errors": 0,
+            "bad_json": 0,
+            "cancelled": 0,
+            "queue_ms": 0.0,
+            "max_queue_ms": 0.0,
+        }
+        self.queue_samples: List[Tuple[float, float]] = []  # (time.time(), queue ms)
+
+    def factor(self) -> float:
+        with self._lock:
+            return self._rng.lognormvariate(0.0, self.jitter) if self.jitter > 0 else 1.0
+
+    def _roll(self, rate: float) -> bool:
+        with self._lock:
+            return rate > 0 and self._rng.random() < rate
+
+    def reply_for(self, messages: List[Dict[str, Any]]) -> Tuple[str, bool]:
+        """``(content, failed)`` for the request's step; failed means HTTP 500."""
+        user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") == "user"), "")
+        m = _STEP_RE.search(user)
+        step = m.group(1) if m else ""
+        if self._roll(self.error_rate):
+            return "", True
+        if step == "symptom_options":
+            if self._roll(self.bad_json_rate):
+                with self._lock:
+                    self.stats["bad_json"] += 1
+                return "Here are some symptoms: pain, swelling", False
+            return SYMPTOM_REPLY, False
+        if step == "summary":
+            return SUMMARY_REPLY, False
+        return "ok", False
+
+    def acquire(self) -> float:
+        """Wait for a generation slot; returns the wait in ms."""
+        started = time.perf_counter()
+        self._slots.acquire()
+        waited = (time.perf_counter() - started) * 1000.0
+        with self._lock:
+            self.stats["requests"] += 1
+            self.stats["queue_ms"] += waited
+            self.stats["max_queue_ms"] = max(self.stats["max_queue_ms"], waited)
+            self.queue_samples.append((time.time(), waited))
+        return waited
+
+    def release(self) -> None:
+        self._slots.release()
+
+    def count(self, key: str) -> None:
+        with self._lock:
+            self.stats[key] += 1
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            out = dict(self.stats)
+        out["avg_queue_ms"] = out["queue_ms"] / out["requests"] if out["requests"] else 0.0
+        return out
+
+
+def _chunks(text: str) -> List[str]:
+    """Word-sized pieces (whitespace kept), standing in for tokens."""
+    return re.findall(r"\S+\s*|\s+", text) or [""]
+
+
+def make_handler(state: StubState) -> type:
+    class StubHandler(BaseHTTPRequestHandler):
+        def _reply(self, status: int, payload: Any) -> None:
+            body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self) -> None:
+            if self.path == "/stats":
+                self._reply(200, state.snapshot())
+            else:
+                self._reply(404, {"error": f"unknown path {self.path}"})
+
+        def do_POST(self) -> None:
+            if self.path != "/api/chat":
+                self._reply(404, {"error": f"unknown path {self.path}"})
+                return
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                body = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                self._reply(400, {"error": "invalid JSON body"})
+                return
+
+            messages = body.get("messages") or []
+            content, failed = state.reply_for(messages)
+            if failed:
+                state.count("errors")
+                self._reply(500, {"error": "stub: injected failure"})
+                return
+
+            prompt_chars = sum(len(m.get("content") or "") for m in messages)
+            factor = state.factor()
+            ttft_s = state.ttft_ms * factor / 1000.0
+            token_s = state.token_ms * factor / 1000.0
+            pieces = _chunks(content)
+
+            state.acquire()
+            try:
+                started = time.perf_counter()
+                time.sleep(ttft_s)
+                done = {
+                    "model": body.get("model"),
+                    "done": True,
+                    "prompt_eval_count": prompt_chars // 4,
+                    "prompt_eval_duration": int(ttft_s * 1e9),
+                    "eval_count": len(pieces),
+                }
+                try:
+                    if not body.get("stream"):
+                        time.sleep(token_s * len(pieces))
+                        done["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                        self._reply(200, dict(done, message={"role": "assistant", "content": content}))
+                        return
+
+                    self.send_response(200)
+                    self.send_header("Content-Type", "application/x-ndjson")
+                    self.end_headers()
+                    for piece in pieces:
+                        time.sleep(token_s)
+                        line = {"model": body.get("model"), "done": False,
+                                "message": {"role": "assistant", "content": piece}}
+                        self.wfile.write(json.dumps(line).encode("utf-8") + b"\n")
+                        self.wfile.flush()
+                    done["total_duration"] = int((time.perf_counter() - started) * 1e9)
+                    done["message"] = {"role": "assistant", "content": ""}
+                    self.wfile.write(json.dumps(done).encode("utf-8") + b"\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    # Client closed early (stream done or timed out); stop "generating".
+                    state.count("cancelled")
+            finally:
+                state.release()
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass
+
+    return StubHandler
+
+
+def start_stub(
+    state: StubState | None = None,
+    host: str = "127.0.0.1",
+    port: int = 0,
+) -> Tuple[ThreadingHTTPServer, StubState, str]:
+    """
+    Serve the stub from a daemon thread (``port=0`` picks a free port).
+    Returns ``(server, state, base_url)``; call ``server.shutdown()`` when done.
+    """
+    state = state or StubState()
+    server = ThreadingHTTPServer((host, port), make_handler(state))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, state, f"http://{host}:{server.server_address[1]}"
+
+
+def main(argv: List[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Serve a stub Ollama /api/chat with tunable latency.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=11435)
+    parser.add_argument("--ttft-ms", type=float, default=300.0)
+    parser.add_argument("--token-ms", type=float, default=15.0)
+    parser.add_argument("--jitter", type=float, default=0.2)
+    parser.add_argument("--parallel", type=int, default=4)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--bad-json-rate", type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    state = StubState(
+        args.ttft_ms, args.token_ms, args.jitter, args.parallel,
+        args.error_rate, args.bad_json_rate,
+    )
+    server = ThreadingHTTPServer((args.host, args.port), make_handler(state))
+    print(f"[stub_ollama] Serving /api/chat on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,331 @@
+# src/doctor_patient/tools/symptom_tier.py
+"""
+Materialized symptom options for frequent chief-complaint clusters.
+
+Offline, the CHIEF COMPLAINT lines of the corpus notes are grouped by
+leader clustering on their content words, and every cluster with at least
+MIN_CLUSTER_SIZE members gets its ``symptom_options`` generated once by the
+LLM (crew.generate_symptom_options on the cluster label):
+
+    python -m doctor_patient.tools.symptom_tier [--dry-run] [--out PATH]
+
+At request time ``lookup`` returns the nearest cluster that covers every
+content term of the complaint, if its cosine similarity is at least
+MIN_SIMILARITY, and run_symptom_flow serves its options without calling
+the LLM. ``record`` /
+``tier_stats`` track the hit rate and the latency saved.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import math
+import os
+import re
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+from . import retrieval
+
+TIER_VERSION = 1
+TIER_PATH = retrieval.DATA_DIR / "train_subjective.symptom_tier.json"
+
+# Leader clustering: join a cluster at this cosine similarity to its leader.
+CLUSTER_SIMILARITY = 0.7
+
+# Only clusters this frequent are worth an offline LLM call.
+MIN_CLUSTER_SIZE = 2
+
+# Serve from the tier at or above this similarity; "1.1" disables it.
+MIN_SIMILARITY = float(os.environ.get("DOCTOR_PATIENT_SYMPTOM_TIER_MIN_SIM", "0.75"))
+
+_WORD_RE = re.compile(r"[a-z]+")
+
+# Filler and laterality words: "right knee pain" and "my knee hurts... pain
+# in the left knee" should land on the same cluster.
+_STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "in", "on", "at", "to", "for", "with",
+    "from", "after", "since", "my", "i", "ive", "im", "me", "have", "has", "had",
+    "been", "is", "am", "are", "was", "it", "its", "this", "that", "some", "very",
+    "really", "days", "day", "weeks", "week", "months", "month", "ago", "now",
+    "up", "new", "patient", "evaluation", "history",
+    "right", "left", "bilateral", "sided", "side", "both", "worse", "than",
+}
+
+_TIER: Dict[str, Any] | None = None
+_TIER_LOADED = False
+
+_STATS: Dict[str, float] = {
+    "lookups": 0,
+    "hits": 0,
+    "hit_ms": 0.0,
+    "miss_ms": 0.0,
+    "saved_ms": 0.0,
+}
+
+
+def content_terms(text: str) -> Set[str]:
+    return {
+        w for w in _WORD_RE.findall((text or "").lower())
+        if len(w) > 1 and w not in _STOPWORDS
+    }
+
+
+def _cosine(a: Set[str], b: Set[str]) -> float:
+    if not a or not b:
+        return 0.0
+    return len(a & b) / math.sqrt(len(a) * len(b))
+
+
+def _serves(terms: Set[str], cluster_terms: Set[str]) -> float | None:
+    """
+    Similarity if the cluster may answer a complaint with ``terms``, else
+    None. Every complaint term must be covered: "back pain and fever" is
+    close to "back pain" by cosine, but canned options would drop the fever.
+    """
+    if not terms or not terms <= cluster_terms:
+        return None
+    sim = _cosine(terms, cluster_terms)
+    return sim if sim >= MIN_SIMILARITY else None
+
+
+# ---------------------------------------------------------------------
+# Offline: cluster complaints and materialize options
+# ---------------------------------------------------------------------
+
+def corpus_complaints() -> List[Tuple[int, str]]:
+    """``(case id, CHIEF COMPLAINT line)`` for every note that has one."""
+    out = []
+    for c in retrieval.iter_subjective_cases():
+        cc = retrieval._extract_chief_complaint_text(c["raw"].get("tgt") or "")
+        if cc:
+            out.append((c["id"], cc))
+    return out
+
+
+def cluster_complaints(
+    complaints: Iterable[Tuple[int, str]],
+    similarity: float = CLUSTER_SIMILARITY,
+    min_size: int = MIN_CLUSTER_SIZE,
+) -> List[Dict[str, Any]]:
+    """
+    Leader clustering: distinct term sets are visited most frequent first,
+    and each joins the first leader within ``similarity`` or leads a new
+    cluster. Returns clusters of at least ``min_size`` complaints, largest
+    first; each cluster's label is its leader's most common wording.
+    """
+    groups: Dict[frozenset, List[Tuple[int, str]]] = {}
+    for case_id, text in complaints:
+        terms = frozenset(content_terms(text))
+        if terms:
+            groups.setdefault(terms, []).append((case_id, text))
+
+    ordered = sorted(groups.items(), key=lambda kv: (-len(kv[1]), sorted(kv[0])))
+    clusters: List[Dict[str, Any]] = []
+    for terms, members in ordered:
+        for cluster in clusters:
+            if _cosine(set(terms), set(cluster["terms"])) >= similarity:
+                cluster["members"].extend(members)
+                break
+        else:
+            texts = [t for _, t in members]
+            clusters.append(
+                {
+                    "terms": sorted(terms),
+                    "label": max(sorted(set(texts)), key=texts.count),
+                    "members": list(members),
+                }
+            )
+
+    out = []
+    for cluster in sorted(clusters, key=lambda c: (-len(c["members"]), c["label"])):
+        if len(cluster["members"]) < min_size:
+            continue
+        out.append(
+            {
+                "id": len(out),
+                "label": cluster["label"],
+                "terms": cluster["terms"],
+                "size": len(cluster["members"]),
+                "members": [
+                    {"case_id": case_id, "text": text}
+                    for case_id, text in sorted(cluster["members"])
+                ],
+            }
+        )
+    return out
+
+
+def _prompt_fingerprint() -> str:
+    """Options go stale when the symptom prompt or the model changes."""
+    from .. import crew
+
+    h = hashlib.sha256()
+    h.update(crew.SYSTEM_PREFIX.encode("utf-8"))
+    for model in crew.flow_route("symptom_options")["models"]:
+        h.update(b"\0" + model.encode("utf-8"))
+    return h.hexdigest()
+
+
+def build_tier(clusters: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Generate ``symptom_options`` for every cluster (one LLM call each)."""
+    from .. import crew
+
+    materialized = []
+    for cluster in clusters:
+        started = time.perf_counter()
+        options = crew.generate_symptom_options(cluster["label"])
+        elapsed_ms = (time.perf_counter() - started) * 1000.0
+        if not options:
+            print(f"[symptom_tier] No options for cluster {cluster['label']!r}; skipped")
+            continue
+        materialized.append(
+            dict(cluster, id=len(materialized), symptom_options=options, generate_ms=elapsed_ms)
+        )
+        print(
+            f"[symptom_tier] Cluster {cluster['label']!r} ({cluster['size']} cases): "
+            f"{len(options)} options in {elapsed_ms:.0f} ms"
+        )
+
+    return {
+        "version": TIER_VERSION,
+        "source": retrieval._corpus_fingerprint(),
+        "prompt": _prompt_fingerprint(),
+        "cluster_similarity": CLUSTER_SIMILARITY,
+        "clusters": materialized,
+    }
+
+
+def load_tier(path: Path = TIER_PATH) -> Dict[str, Any] | None:
+    """Load a persisted tier if it matches the corpus and prompt, else None."""
+    if not path.exists():
+        return None
+    with path.open("r", encoding="utf-8") as f:
+        tier = json.load(f)
+    if tier.get("version") != TIER_VERSION:
+        return None
+    if tier.get("source") != retrieval._corpus_fingerprint():
+        return None
+    if tier.get("prompt") != _prompt_fingerprint():
+        print(f"[symptom_tier] {path} was built for another prompt/model; ignoring it")
+        return None
+    return tier
+
+
+def _load_tier() -> Dict[str, Any] | None:
+    global _TIER, _TIER_LOADED
+    if not _TIER_LOADED:
+        _TIER = load_tier()
+        _TIER_LOADED = True
+        if _TIER is not None:
+            for cluster in _TIER["clusters"]:
+                cluster["_terms"] = set(cluster["terms"])
+            print(f"[symptom_tier] Loaded {len(_TIER['clusters'])} clusters from {TIER_PATH}")
+    return _TIER
+
+
+# ---------------------------------------------------------------------
+# Request time
+# ---------------------------------------------------------------------
+
+def lookup(chief_complaint: str) -> Tuple[Dict[str, Any], float] | None:
+    """Nearest materialized cluster that may serve the complaint, and its similarity."""
+    tier = _load_tier()
+    if tier is None:
+        return None
+    terms = content_terms(chief_complaint)
+    best: Tuple[Dict[str, Any], float] | None = None
+    for cluster in tier["clusters"]:
+        sim = _serves(terms, cluster["_terms"])
+        if sim is not None and (best is None or sim > best[1]):
+            best = (cluster, sim)
+    return best
+
+
+def record(hit: bool, elapsed_ms: float, cluster: Dict[str, Any] | None = None) -> None:
+    """
+    Account one run_symptom_flow call. A hit saves the average latency of
+    the LLM path observed so far (the cluster's offline generation time
+    until a miss has been seen) minus its own.
+    """
+    _STATS["lookups"] += 1
+    if not hit:
+        _STATS["miss_ms"] += elapsed_ms
+        return
+
+    _STATS["hits"] += 1
+    _STATS["hit_ms"] += elapsed_ms
+    misses = _STATS["lookups"] - _STATS["hits"]
+    if misses:
+        llm_ms = _STATS["miss_ms"] / misses
+    else:
+        llm_ms = (cluster or {}).get("generate_ms", 0.0)
+    _STATS["saved_ms"] += max(llm_ms - elapsed_ms, 0.0)
+
+
+def tier_stats() -> Dict[str, float]:
+    lookups = _STATS["lookups"]
+    hits = _STATS["hits"]
+    return {
+        **_STATS,
+        "hit_rate": hits / lookups if lookups else 0.0,
+        "avg_hit_ms": _STATS["hit_ms"] / hits if hits else 0.0,
+        "avg_miss_ms": _STATS["miss_ms"] / (lookups - hits) if lookups > hits else 0.0,
+    }
+
+
+def replay_hit_rate(tier: Dict[str, Any], complaints: Iterable[str]) -> Dict[str, float]:
+    """Offline hit rate of ``tier`` over a stream of complaints (no LLM)."""
+    clusters = [(c, set(c["terms"])) for c in tier["clusters"]]
+    n = hits = 0
+    for text in complaints:
+        n += 1
+        terms = content_terms(text)
+        if any(_serves(terms, t) is not None for _, t in clusters):
+            hits += 1
+    return {"complaints": float(n), "hits": float(hits), "hit_rate": hits / n if n else 0.0}
+
+
+# ---------------------------------------------------------------------
+# CLI
+# ---------------------------------------------------------------------
+
+def main(argv: List[str] | None = None) -> None:
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Materialize symptom options per complaint cluster.")
+    parser.add_argument("--out", type=Path, default=TIER_PATH)
+    parser.add_argument("--similarity", type=float, default=CLUSTER_SIMILARITY)
+    parser.add_argument("--min-size", type=int, default=MIN_CLUSTER_SIZE)
+    parser.add_argument(
+        "--dry-run", action="store_true",
+        help="Print the clusters and their corpus coverage without calling the LLM.",
+    )
+    args = parser.parse_args(argv)
+
+    complaints = corpus_complaints()
+    clusters = cluster_complaints(complaints, args.similarity, args.min_size)
+    covered = sum(c["size"] for c in clusters)
+    print(
+        f"[symptom_tier] {len(clusters)} clusters cover {covered}/{len(complaints)} "
+        f"corpus complaints"
+    )
+    for c in clusters:
+        print(f"  {c['size']:3d}  {c['label']}  {c['terms']}")
+    if args.dry_run:
+        return
+
+    tier = build_tier(clusters)
+    retrieval.save_index(tier, args.out)
+    print(f"[symptom_tier] Wrote {len(tier['clusters'])} clusters to {args.out}")
+
+    replay = replay_hit_rate(tier, (text for _, text in complaints))
+    print(
+        f"[symptom_tier] Corpus replay: {replay['hits']:.0f}/{replay['complaints']:.0f} "
+        f"complaints served from the tier ({100 * replay['hit_rate']:.1f}%)"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import streamlit as st
 from src.doctor_patient.crew import (
+    OllamaSession,
     run_symptom_flow,
     run_drug_flow,
     run_summary_flow,
@@ -23,6 +24,8 @@ if "step" not in st.session_state:
     st.session_state.drug_options = []
     st.session_state.selected_drugs = []
     st.session_state.summary = ""
+    # One LLM conversation per wizard run, so each step reuses the last prompt.
+    st.session_state.llm = OllamaSession()
 
 
 def goto(step: int):
@@ -43,7 +46,7 @@ if st.session_state.step == 1:
         if chief.strip():
             st.session_state.chief = chief.strip()
             with st.spinner("Analyzing..."):
-                st.session_state.symptom_options = run_symptom_flow(chief)
+                st.session_state.symptom_options = run_symptom_flow(chief, st.session_state.llm)
             goto(2)
         else:
             st.warning("Please enter your complaint.")
@@ -57,6 +60,8 @@ elif st.session_state.step == 2:
     st.header("Step 2 — Select symptoms")
 
     opts = st.session_state.symptom_options
+    if getattr(opts, "served_by", "") == "retrieval":
+        st.caption("The language model was too slow; these options come from similar cases.")
     if not opts:
         st.error("No symptom options found. Try again.")
         if st.button("Back"):
@@ -104,6 +109,7 @@ elif st.session_state.step == 3:
                 st.session_state.chief,
                 st.session_state.selected_symptoms,
                 st.session_state.selected_drugs,
+                st.session_state.llm,
             )
         goto(4)
 
@@ -118,6 +124,8 @@ elif st.session_state.step == 3:
 elif st.session_state.step == 4:
     st.header("Step 4 — Summary")
     st.markdown(st.session_state.summary)
+    if getattr(st.session_state.summary, "served_by", "") == "retrieval":
+        st.caption("Template note from similar cases (language model unavailable or too slow).")
 
     st.info("This is a research demo. Not medical advice.")
 